@@ -0,0 +1,319 @@
+# asyncio variant of the Gothello client library gthclient.py: the same
+# handshake, make_move()/get_move() semantics, attributes and error
+# classes, with coroutines that never block the event loop. Every read
+# can be given a deadline, and a search can run in an executor while a
+# move is awaited.
+#
+# SyncGthClient wraps it for code written against gthclient.GthClient.
+
+import asyncio
+
+from gthclient import (client_version, server_base, ClientError, MoveError,
+  MessageError, ProtocolError, opponent)
+from transport import StreamTransport
+
+
+class DeadlineError(ClientError):
+  """
+  Raised when a message did not arrive before its deadline. The
+  connection stays usable, the message may still be read later.
+  """
+
+  def __init__(self, timeout, message):
+    self.timeout = timeout
+    self.message = message
+
+
+class AsyncGthClient:
+  """
+  Gothello client over a transport.py transport. Create one with
+  connect() for a server, or connect_transport() for any transport such
+  as the in-memory pipes of Referee.connect_memory().
+  """
+
+  def __init__(self, side, transport):
+    self.transport = transport
+
+    # Current move number.
+    self.serial = 1
+
+    # Time controls and times remaining.
+    self.white_time_control = None
+    self.black_time_control = None
+    self.my_time = None
+    self.opp_time = None
+
+    # At end of game, reports who won.
+    self.winner = None
+
+    # Set when the game ended in a draw, reported as a MoveError
+    # like gthclient does.
+    self.drawn = False
+
+    # Side we are playing.
+    self.who = side
+
+  @classmethod
+  async def connect(cls, side, host, server, timeout=None):
+    """
+    Connect to the server with the given number on host, and wait for
+    the opponent.
+    :param timeout: seconds allowed for each message of the handshake
+    """
+    reader, writer = await asyncio.open_connection(host,
+                                                   server_base + server)
+    return await cls.connect_transport(side, StreamTransport(reader, writer),
+                                       timeout)
+
+  @classmethod
+  async def connect_transport(cls, side, transport, timeout=None):
+    client = cls(side, transport)
+    try:
+      await client.handshake(timeout)
+    except BaseException:
+      client.closeall()
+      raise
+    return client
+
+  async def handshake(self, timeout=None):
+    # Check that this is a valid server.
+    msg_code, msg_text = await self.get_msg(timeout)
+    if msg_code != 0:
+      raise ProtocolError(msg_code, msg_text, "illegal greeting")
+
+    # Tell the server what we're doing. Get ack and time controls.
+    await self.send("{} player {}".format(client_version, self.who))
+    msg_code, msg_text = await self.get_msg(timeout)
+    if msg_code not in {100, 101}:
+      raise ProtocolError(msg_code, msg_text, "side failure")
+
+    if msg_code == 101:
+      self.get_time_controls(msg_text)
+      if self.who == "white":
+        self.my_time = self.white_time_control
+        self.opp_time = self.black_time_control
+      else:
+        self.my_time = self.black_time_control
+        self.opp_time = self.white_time_control
+
+    # Wait for the opponent to connect, as long as it takes, and check
+    # that they are playing the other side.
+    msg_code, msg_text = await self.get_msg()
+    if ((msg_code != 351 and self.who == "white")
+        or (msg_code != 352 and self.who == "black")):
+      raise ProtocolError(msg_code, msg_text, "got wrong side")
+
+  async def get_msg(self, timeout=None):
+    """
+    Get a message from the server. Ignores blank lines.
+    :param timeout: seconds to wait at most, None for no limit
+    :return: a tuple of the decoded message code and the rest of the
+             message text
+    """
+    while True:
+      try:
+        line = await asyncio.wait_for(self.transport.readline(), timeout)
+      except asyncio.TimeoutError:
+        raise DeadlineError(timeout, "no message before the deadline")
+      if line is None:
+        raise MoveError(MoveError.DISCO, "disconnected")
+      words = line.split()
+      if len(words) > 0:
+        break
+    if len(words[0]) != 3:
+      raise MessageError(line, "invalid message code")
+    for c in words[0]:
+      if c not in "0123456789":
+        raise MessageError(c, "invalid message code digit")
+    return (int(words[0]), ' '.join(words[1:]))
+
+  def closeall(self):
+    """
+    Close the connection to the server.
+    """
+    self.transport.close()
+
+  def get_time_controls(self, msg_text):
+    words = msg_text.split()
+    time_controls = [int(t) for t in words[:2]]
+    if len(time_controls) > 0:
+      self.white_time_control = time_controls[0]
+    if len(time_controls) > 1:
+      self.black_time_control = time_controls[1]
+    else:
+      self.black_time_control = self.white_time_control
+
+  def get_time(self, msg_text):
+    return int(msg_text.split()[0])
+
+  async def send(self, msg_text):
+    """
+    Send a line to the server.
+    """
+    self.transport.write(msg_text + "\r\n")
+    await self.transport.drain()
+
+  async def make_move(self, pos, timeout=None):
+    """
+    Given a position string in standard format or "pass", send to the
+    server.
+    :param timeout: seconds to wait for each answer of the server
+    :return: False when the game is over
+    """
+    # Check that game is still on.
+    if self.winner != None:
+      raise MoveError(MoveError.DONE, "move with game over")
+
+    # Send the move to the server.
+    ellipses = " ..." if self.who == "white" else ""
+    await self.send("{}{} {}".format(self.serial, ellipses, pos))
+
+    # Get an ack from the server.
+    msg_code, msg_text = await self.get_msg(timeout)
+    if msg_code == 201:
+      self.winner = self.who
+    elif msg_code == 202:
+      self.winner = opponent(self.who)
+    elif msg_code == 203:
+      self.drawn = True
+      raise MoveError(MoveError.DISCO, "disconnected")
+
+    # If game is over shut down the connection.
+    if self.winner != None:
+      self.closeall()
+      return False
+
+    # Check for issues.
+    if msg_code != 200 and msg_code != 207:
+      if msg_code == 291:
+        raise MoveError(MoveError.ILLEGAL, "illegal move")
+      raise ProtocolError(msg_code, msg_text,
+                          "unexpected move result code")
+
+    # Record time remaining if needed.
+    if msg_code == 207:
+      self.my_time = self.get_time(msg_text)
+
+    # Get the game status.
+    msg_code, msg_text = await self.get_msg(timeout)
+    if msg_code < 311 or msg_code > 318:
+      raise ProtocolError(msg_code, msg_text, "unexpected move status code")
+
+    return True
+
+  async def get_move(self, timeout=None):
+    """
+    Get an opponent move from the server.
+    :param timeout: seconds to wait at most, None for no limit
+    :return: a tuple: a boolean that is False when the game is over, and
+             the actual move string
+    """
+    # Check that game is still on.
+    if self.winner != None:
+      raise MoveError(MoveError.DONE, "read move with game over")
+
+    # Get the move and parse it.
+    msg_code, msg_text = await self.get_msg(timeout)
+    words = msg_text.split()
+    pos = None
+    if msg_code in {311, 321, 322, 325, 315}:
+      side = "black"
+      self.serial = int(words[0])
+      pos = words[1]
+    elif msg_code in {313, 317}:
+      side = "black"
+      self.serial = int(words[0])
+      pos = words[1]
+      self.opp_time = int(words[2])
+    elif msg_code in {312, 323, 324, 326, 316}:
+      side = "white"
+      self.serial = int(words[0])
+      pos = words[2]
+    elif msg_code in {314, 318}:
+      side = "white"
+      self.serial = int(words[0])
+      pos = words[2]
+      self.opp_time = int(words[3])
+    elif msg_code in {361, 362}:
+      # the flag of either side fell, no move comes with it
+      side = opponent(self.who)
+    else:
+      raise ProtocolError(msg_code, msg_text, "unknown move status code")
+
+    # Check for weirdness.
+    if side != opponent(self.who):
+      raise ProtocolError(msg_code, msg_text,
+                          "move received from wrong side")
+
+    # Return an appropriate result.
+    if self.who == "white":
+      if msg_code in {311, 313, 315, 317}:
+        return (True, pos)
+      if msg_code in {321, 361}:
+        self.winner = "black"
+        return (False, pos)
+      if msg_code in {322, 362}:
+        self.winner = "white"
+        return (False, pos)
+      if msg_code == 325:
+        self.drawn = True
+        raise MoveError(MoveError.DISCO, "game terminated early")
+    else:
+      # Auto-bump the serial since new turn.
+      self.serial += 1
+      if msg_code in {312, 314, 316, 318}:
+        return (True, pos)
+      if msg_code in {323, 362}:
+        self.winner = "white"
+        return (False, pos)
+      if msg_code in {324, 361}:
+        self.winner = "black"
+        return (False, pos)
+      if msg_code == 326:
+        self.drawn = True
+        raise MoveError(MoveError.DISCO, "game terminated early")
+    raise ProtocolError(msg_code, msg_text, "unexpected move status code")
+
+
+class SyncGthClient:
+  """
+  Blocking client with the interface of gthclient.GthClient, running an
+  AsyncGthClient on an event loop of its own. Methods take the same
+  optional timeout as the asynchronous ones.
+  """
+
+  def __init__(self, side, host, server, timeout=None):
+    self.loop = asyncio.new_event_loop()
+    try:
+      self.client = self.loop.run_until_complete(
+        AsyncGthClient.connect(side, host, server, timeout))
+    except BaseException:
+      self.loop.close()
+      raise
+
+  def __getattr__(self, name):
+    # serial, winner, my_time... are the asynchronous client's
+    client = self.__dict__.get('client')
+    if client is None:
+      raise AttributeError(name)
+    return getattr(client, name)
+
+  def get_msg(self, timeout=None):
+    return self.loop.run_until_complete(self.client.get_msg(timeout))
+
+  def send(self, msg_text):
+    self.loop.run_until_complete(self.client.send(msg_text))
+
+  def make_move(self, pos, timeout=None):
+    return self.loop.run_until_complete(self.client.make_move(pos, timeout))
+
+  def get_move(self, timeout=None):
+    return self.loop.run_until_complete(self.client.get_move(timeout))
+
+  def closeall(self):
+    if self.loop.is_closed():
+      return
+    self.client.closeall()
+    # let the transport finish closing
+    self.loop.run_until_complete(asyncio.sleep(0))
+    self.loop.close()
@@ -1,20 +1,36 @@
-import copy
 import random
-import uuid
 
 from board import (Board, Move, ILLEGAL_MOVE, CONTINUE, 
-  GAME_OVER, PLAYER_BLACK, PLAYER_WHITE)
+  GAME_OVER, PLAYER_BLACK, PLAYER_WHITE, transform_move, untransform_move)
 
+from bitboard import BitBoard
 from minimax_utility import MinimaxUtility
+from transposition import TranspositionTable, ENTRY_MOVE
+from endgame import EndgameSolver, empty_count
+import parallel
+import batcheval
 
 
 inf = 999999
 
 iter_deepening_resource_exhausted = 1
+iter_deepening_time_exhausted = 2
+search_aborted = 3
 
 print_killer_moves = 1
 print_move_paths = 2
 
+# deepest ply with killer moves, iterative deepening stops at depth 25
+max_ply = 26
+
+# move ordering scores, above anything the history table reaches
+tt_move_score = 1 << 42
+killer_move_score = 1 << 40
+
+# value of a position the endgame solver proved won, above anything
+# evaluate() returns
+endgame_win_score = 10000
+
 
 class TerminationException(Exception):
 
@@ -41,7 +57,17 @@ class AlphaBetaPruning(MinimaxUtility):
                move_selection=False,
                print_leaves=False, 
                print_stats=False,
-               print_move_lists=False):
+               print_move_lists=False,
+               ttable_size=500000,
+               search="minimax",
+               aspiration_window=0,
+               time_manager=None,
+               workers=1,
+               endgame=0,
+               book=None,
+               symmetry=False,
+               tablebase=None,
+               batch_eval=False):
           
     super().__init__(side, 
                      eval_method=eval_method, 
@@ -60,75 +86,275 @@ class AlphaBetaPruning(MinimaxUtility):
     self.nvisited = 0 
     self.npruned = 0
     self.nttablehit = 0
-
-    # recorded best path during searching
-    self.move_path = [None, []]
-    self.killer_moves = []
+    self.nresearched = 0
+    self.nfirstcutoffs = 0
+
+    # "minimax" searches with __max_value/__min_value, "pvs" with the 
+    # negamax principal variation search in __negamax
+    if search not in ("minimax", "pvs"):
+      raise Exception("unexpected search method")
+    self.search = search
+
+    # triangular principal variation table: pv[ply][ply:pv_length[ply]]
+    # is the best line found from ply, filled when a move improves the
+    # window, so its size only depends on the depth
+    self.pv = [[None] * max_ply for _ in range(max_ply)]
+    self.pv_length = [0 for _ in range(max_ply)]
+
+    # move ordering: two killer moves per ply, replaced on cutoffs, and
+    # a history score per square kept for the whole game
+    self.killers = [[None, None] for _ in range(max_ply)]
+    self.history = [0 for _ in range(25)]
+    # undo stack height at the root of the previous decision
+    self.last_root_height = None
 
     # whether or not iterative deepening search
     self.iterdeepening = iterdeepening
     self.maximum_visited = maximum_visited
     self.stop_deepening = False
 
-    # hash key for transposition table, this will be 
-    # manually updated after try_move() being called 
-    self.zobrist_key = 0
+    # half width of the first window around the previous iteration's 
+    # value, 0 searches every iteration with a full window
+    self.aspiration_window = aspiration_window
+    self.naspiration_researched = 0
+
+    # a TimeManager replaces the maximum_visited budget with deadlines,
+    # its start() must be called before each decision()
+    self.time_manager = time_manager
+    if time_manager != None:
+      self.iterdeepening = True
+
+    # set from another thread to stop the running search, see Ponderer
+    self.abort_search = False
+
+    # whether the last decision() ran its search to the end: not cut 
+    # short by the node budget, the hard deadline or an abort
+    self.search_completed = False
+
+    # whether decision() ages the transposition table, a Ponderer ages
+    # it once for all the decisions of a session instead
+    self.age_table = True
+
+    # number of processes sharing the root moves, see parallel.py
+    self.workers = workers
+
+    # kept for the whole game, so both the iterations of iterative 
+    # deepening and the next decisions reuse earlier results
+    self.ttable = TranspositionTable(max_entries=ttable_size)
+
+    # positions with at most this many empty cells are solved exactly
+    # by the endgame solver instead of being searched, 0 never
+    self.endgame = endgame
+    self.endgame_solver = EndgameSolver() if endgame > 0 else None
+
+    # an OpeningBook consulted before searching, or None
+    self.book = book
+
+    # a Tablebase giving the exact value of positions it holds, or None
+    self.tablebase = tablebase
+    self.ntablebasehit = 0
+
+    # whether the leaves below depth 1 nodes are evaluated together
+    # with NumPy, see batcheval.py
+    if batch_eval and not batcheval.available():
+      raise Exception("batched evaluation needs numpy")
+    self.batch_eval = batch_eval
+
+    # whether the transposition table and endgame cache share entries
+    # between rotations and reflections of a position; the tablebase
+    # is keyed by canonical keys, which are only cheap to find with the
+    # symmetric keys kept up to date
+    if symmetry or tablebase != None:
+      self.enable_symmetry()
 
   def decision(self):
     self.nvisited, self.npruned, self.nttablehit = 0, 0, 0
-    self.move_path = [None, []]
-    zobrist_table = AlphaBetaPruning.init_zobrist_table()
-    transposition = {}
+    self.nresearched = 0
+    self.naspiration_researched = 0
+    self.nfirstcutoffs = 0
+    self.ntablebasehit = 0
+    self.search_completed = False
+    if self.age_table:
+      self.ttable.new_search()
+    self.__age_move_ordering()
+    if self.book != None:
+      move = self.book.lookup(self)
+      if move is not None:
+        if self.print_stats:
+          print("book move: ", move)
+        self.search_completed = True
+        return move
+    if self.endgame_solver != None:
+      self.endgame_solver.nsolved = 0
+      if empty_count(self) <= self.endgame:
+        return self.__solve_root()
     if not self.iterdeepening:
-      _, move = self.__max_value(self, self.depth, -inf, inf, [], 
-                                 transposition=transposition,
-                                 zobrist_table=zobrist_table)
+      v, move = self.__search_root(self.depth, -inf, inf)
       self.__print_stats()
-      self.__print_moves(print_move_paths)
-      self.__generate_killer_moves(self.depth)
+      self.__print_moves(print_move_paths, v)
       self.__print_moves(print_killer_moves)
+      self.search_completed = True
       return move
     else:
       self.stop_deepening = False
       return self.__iter_deepening()
 
-  def __max_value(self, board, depth, alpha, beta, path, 
-                  transposition=None, zobrist_table=None):
+  def __solve_root(self):
+    """
+    Best move of a position the endgame solver can handle, which may 
+    be a pass.
+    """
+    root_height = len(self.undo_stack)
+    try:
+      result, move = self.endgame_solver.best_move(self, 
+                                                   self.__check_stop)
+    except TerminationException:
+      while len(self.undo_stack) > root_height:
+        self.unmake_move()
+      if self.print_stats:
+        print("out of time solving, elapsed: ", 
+              self.time_manager.elapsed())
+      return self.__static_move()
+    if self.print_stats:
+      print("endgame solved: ", result, "move: ", move)
+      print("number of endgame positions solved: ", 
+            self.endgame_solver.nsolved, 
+            "cached: ", len(self.endgame_solver))
+    self.search_completed = True
+    return move
+
+  def __static_move(self):
+    """
+    Move with the best evaluation once played, for when there is no
+    time left to search; None to pass if there is no move.
+    """
+    best, best_move = None, None
+    for move, _ in self.gen_moves():
+      self.make_move(move)
+      value = self.__eval(self)
+      self.unmake_move()
+      if best == None or value > best:
+        best, best_move = value, move
+    return best_move
+
+  def __search_root(self, depth, alpha, beta):
+    """
+    Search the current position with the selected search method.
+    :return: value from the point of view of self.side, and best move
+    """
+    result = None
+    if self.workers > 1 and depth > 1:
+      result = parallel.root_split(self, depth, alpha, beta)
+    if result == None:
+      if self.search == "pvs":
+        assert self.to_move == self.side
+        result = self.__negamax(self, depth, alpha, beta, 0)
+      else:
+        result = self.__max_value(self, depth, alpha, beta, 0)
+    # a move tied with the principal variation may have been picked
+    line = self.principal_variation()
+    if result[1] is not None and (not line or line[0] != result[1]):
+      self.set_principal_variation([result[1]])
+    return result
+
+  def root_moves(self, depth):
+    """
+    Moves of the current position, ordered as the root search would.
+    """
+    key, sym = self.__tt_key(self)
+    _, tt_move = self.ttable.probe(key, depth, -inf, inf)
+    return self.__generate_moves(self, 0, 
+                                 tt_move=untransform_move(tt_move, sym))
+
+  def table_move(self):
+    """
+    Best move stored in the transposition table for the current 
+    position, or None.
+    """
+    key, sym = self.__tt_key(self)
+    entry = self.ttable.entries.get(key)
+    if entry is None:
+      return None
+    return untransform_move(entry[ENTRY_MOVE], sym)
+
+  def table_key(self):
+    """
+    Key of the current position in the transposition table.
+    """
+    return self.__tt_key(self)[0]
+
+  def store_position(self, depth, value, alpha, beta, move):
+    """
+    Store the result of searching the current position with window
+    (alpha, beta) in the transposition table.
+    """
+    key, sym = self.__tt_key(self)
+    self.ttable.store(key, depth, value, alpha, beta, 
+                      transform_move(move, sym))
+
+  def search_move(self, move, depth, alpha, beta):
+    """
+    Value of the root move for self.side, searching the position after
+    it depth - 1 plies deep with the selected search method.
+    """
+    self.make_move(move)
+    if self.search == "pvs":
+      value, _ = self.__negamax(self, depth - 1, -beta, -alpha, 1)
+      value = -value
+    else:
+      value, _ = self.__min_value(self, depth - 1, alpha, beta, 1)
+    self.unmake_move()
+    return value
+
+  def principal_variation(self, ply=0):
+    """
+    Best line found by the last search from ply, as a list of moves.
+    """
+    if ply >= max_ply:
+      return []
+    return self.pv[ply][ply:self.pv_length[ply]]
+
+  def set_principal_variation(self, line, ply=0):
+    """
+    Replace the best line from ply, for lines searched elsewhere.
+    """
+    line = line[:max_ply - ply]
+    self.pv[ply][ply:ply + len(line)] = line
+    self.pv_length[ply] = ply + len(line)
+
+  def __max_value(self, board, depth, alpha, beta, ply):
     self.nvisited += 1
-    value, moves = self.__terminal_test(board, depth)
+    self.__check_stop()
+    (key, sym), alpha_orig, beta_orig = self.__tt_key(board), alpha, beta
+    self.__clear_pv(ply)
+    value, tt_move = self.__probe(key, sym, depth, alpha, beta, ply)
+    if value != None:
+      return value, None
+
+    value, moves = self.__terminal_test(board, depth, ply, 
+                                        tt_move=tt_move)
     if value != None and not moves: # end recursion
-      self.__update_move_path(path, value, is_max=False)
       return value, None 
 
     assert value == None and moves
- 
-    if transposition != None:
-      if board.zobrist_key in transposition: 
-        self.nttablehit += 1
-        value = transposition[board.zobrist_key] 
-        self.__update_move_path(path, value, is_max=True)
-        return value, None
 
     value = -inf
     move_candidates = []  # my move candidates that have same eval value 
     max_nlib = -1
-
-    for move, nlib in moves:
-      b = AlphaBetaPruning.board_after_moving(board, move, 
-                                              zobrist_table=zobrist_table)
-      
-      p = [m for m in path]
-      p.append(move)
-      
-      opp_value, _ = self.__min_value(b, depth - 1, alpha, beta, p, 
-                                      transposition=transposition, 
-                                      zobrist_table=zobrist_table)
-
-      if transposition != None:
-        if b.zobrist_key in transposition:
-          assert opp_value == transposition[b.zobrist_key]
-        else:
-          transposition[b.zobrist_key] = opp_value
+    leaf_values = self.__leaf_values(board, depth, ply, moves)
+
+    for i, (move, nlib) in enumerate(moves):
+      if leaf_values != None:
+        self.nvisited += 1
+        opp_value = leaf_values[i]
+      else:
+        board.make_move(move)
+        opp_value, _ = self.__min_value(board, depth - 1, alpha, beta, 
+                                        ply + 1)
+        board.unmake_move()
+
+      if opp_value > alpha:
+        self.__update_pv(ply, move)
       
       # when a greater value is returned
       if opp_value > value:  
@@ -153,50 +379,49 @@ class AlphaBetaPruning(MinimaxUtility):
           move_candidates.append(move)
 
       if value >= beta:
-        self.npruned += 1
-        return value, AlphaBetaPruning.random_pick_move(move_candidates)
+        self.__cutoff(ply, depth, move, i)
+        break
 
       alpha = max(alpha, value)
 
-    return value, AlphaBetaPruning.random_pick_move(move_candidates)
+    move = AlphaBetaPruning.random_pick_move(move_candidates)
+    self.ttable.store(key, depth, value, alpha_orig, beta_orig, 
+                      transform_move(move, sym))
+    return value, move
 
-  def __min_value(self, board, depth, alpha, beta, path, 
-                  transposition=None, zobrist_table=None):
+  def __min_value(self, board, depth, alpha, beta, ply):
     self.nvisited += 1
-    value, moves = self.__terminal_test(board, depth)
+    self.__check_stop()
+    (key, sym), alpha_orig, beta_orig = self.__tt_key(board), alpha, beta
+    self.__clear_pv(ply)
+    value, tt_move = self.__probe(key, sym, depth, alpha, beta, ply)
+    if value != None:
+      return value, None
+
+    value, moves = self.__terminal_test(board, depth, ply, 
+                                        tt_move=tt_move)
     if value != None and not moves: # end recursion
-      self.__update_move_path(path, value, is_max=True)
       return value, None 
     
     assert value == None and moves
 
-    if transposition != None:
-      if board.zobrist_key in transposition:
-        self.nttablehit += 1
-        value = transposition[board.zobrist_key] 
-        self.__update_move_path(path, value, is_max=False)
-        return value, None
-
     value = inf
     move_candidates = []
     max_nlib = -1
+    leaf_values = self.__leaf_values(board, depth, ply, moves)
 
-    for move, nlib in moves:
-      b = AlphaBetaPruning.board_after_moving(board, move, 
-                                              zobrist_table=zobrist_table)
+    for i, (move, nlib) in enumerate(moves):
+      if leaf_values != None:
+        self.nvisited += 1
+        my_value = leaf_values[i]
+      else:
+        board.make_move(move)
+        my_value, _ = self.__max_value(board, depth - 1, alpha, beta, 
+                                       ply + 1)
+        board.unmake_move()
 
-      p = [m for m in path]
-      p.append(move)
-
-      my_value, _ = self.__max_value(b, depth - 1, alpha, beta, p,
-                                     transposition=transposition, 
-                                     zobrist_table=zobrist_table)
-
-      if transposition != None:
-        if b.zobrist_key in transposition:
-          assert my_value == transposition[b.zobrist_key]
-        else:
-          transposition[b.zobrist_key] = my_value
+      if my_value < beta:
+        self.__update_pv(ply, move)
 
       if my_value < value:
         value = my_value
@@ -214,14 +439,130 @@ class AlphaBetaPruning(MinimaxUtility):
           move_candidates.append(move)
 
       if value <= alpha:
-        self.npruned += 1
-        return value, AlphaBetaPruning.random_pick_move(move_candidates)
+        self.__cutoff(ply, depth, move, i)
+        break
 
       beta = min(beta, value)
 
-    return value, AlphaBetaPruning.random_pick_move(move_candidates)
+    move = AlphaBetaPruning.random_pick_move(move_candidates)
+    self.ttable.store(key, depth, value, alpha_orig, beta_orig, 
+                      transform_move(move, sym))
+    return value, move
+
+  def __negamax(self, board, depth, alpha, beta, ply):
+    """
+    Principal variation search in negamax form: values are from the 
+    point of view of the side to move. The first move is searched with
+    the full window, the others with a null window around alpha and 
+    searched again only when they fail high. Since a null window search
+    only bounds the value, ties are not collected: the first best move 
+    in move order is returned.
+    """
+    self.nvisited += 1
+    self.__check_stop()
+    color = 1 if board.to_move == self.side else -1
+    (key, sym), alpha_orig = self.__tt_key(board), alpha
+
+    # the transposition table and evaluate() work from self.side's 
+    # point of view, so flip the window for the opponent
+    self.__clear_pv(ply)
+    if color == 1:
+      value, tt_move = self.__probe(key, sym, depth, alpha, beta, ply)
+    else:
+      value, tt_move = self.__probe(key, sym, depth, -beta, -alpha, ply)
+    if value != None:
+      return color * value, None
+
+    value, moves = self.__terminal_test(board, depth, ply, 
+                                        tt_move=tt_move)
+    if value != None and not moves: # end recursion
+      return color * value, None
+
+    assert value == None and moves
+
+    value = -inf
+    best_move = None
+    leaf_values = self.__leaf_values(board, depth, ply, moves)
+
+    for i in range(len(moves)):
+      move = moves[i][0]
+      if leaf_values != None:
+        # exact values, no null window to search again
+        self.nvisited += 1
+        v = color * leaf_values[i]
+        if v > alpha:
+          self.__update_pv(ply, move)
+        if v > value:
+          value = v
+          best_move = move
+        if value >= beta:
+          self.__cutoff(ply, depth, move, i)
+          break
+        alpha = max(alpha, value)
+        continue
+
+      board.make_move(move)
+      if i == 0:
+        v, _ = self.__negamax(board, depth - 1, -beta, -alpha, ply + 1)
+        v = -v
+      else:
+        v, _ = self.__negamax(board, depth - 1, -alpha - 1, -alpha, 
+                              ply + 1)
+        v = -v
+        if v > alpha and v < beta:
+          # fail high on the null window, the value is only a bound
+          self.nresearched += 1
+          v, _ = self.__negamax(board, depth - 1, -beta, -alpha, ply + 1)
+          v = -v
+      board.unmake_move()
+
+      if v > alpha:
+        self.__update_pv(ply, move)
+
+      if v > value:
+        value = v
+        best_move = move
+
+      if value >= beta:
+        self.__cutoff(ply, depth, move, i)
+        break
 
-  def __terminal_test(self, board, depth):
+      alpha = max(alpha, value)
+
+    best_move_key = transform_move(best_move, sym)
+    if color == 1:
+      self.ttable.store(key, depth, value, alpha_orig, beta, best_move_key)
+    else:
+      self.ttable.store(key, depth, -value, -beta, -alpha_orig, 
+                        best_move_key)
+    return value, best_move
+
+  def __tt_key(self, board):
+    """
+    Transposition table key of board, and the symmetry taking board to
+    the orientation stored moves are in (0 without symmetry).
+    """
+    if board.sym_keys is None:
+      return board.zobrist_key, 0
+    return board.canonical_key()
+
+  def __probe(self, key, sym, depth, alpha, beta, ply):
+    """
+    Look up the transposition table before searching a node. Values are
+    only taken below the root, which must always return a move.
+    :return: a stored value deciding this node or None, and the stored
+             best move or None
+    """
+    if depth <= 0:
+      return None, None
+    value, move = self.ttable.probe(key, depth, alpha, beta)
+    move = untransform_move(move, sym)
+    if value != None and ply > 0:
+      self.nttablehit += 1
+      return value, move
+    return None, move
+
+  def __terminal_test(self, board, depth, ply, tt_move=None):
     """ 
     Decide whether maximum depth is reached, and there is no possible move 
     at current state. And indicate whether we should continue searching 
@@ -229,15 +570,30 @@ class AlphaBetaPruning(MinimaxUtility):
     :return: evaluated value, None    if there is at terminal state
              None, a list of (move, nlib)   if there isn't at terminal state
     """
+    if self.tablebase != None and ply > 0:
+      result = self.tablebase.lookup(board)
+      if result != None:
+        self.ntablebasehit += 1
+        return self.__exact_value(board, result), None
+
+    if (self.endgame_solver != None 
+        and ply > 0 
+        and empty_count(board) <= self.endgame):
+      if ply == 1 and self.iterdeepening:
+        # every root move is solved, deeper iterations cannot change
+        # anything
+        self.stop_deepening = True
+      result = self.endgame_solver.solve(board, self.__check_stop)
+      return self.__exact_value(board, result), None
+
     if depth <= 0:
       return self.__eval(board), None
-    
-    if self.iterdeepening:
-      if self.nvisited >= self.maximum_visited:
-        raise TerminationException(iter_deepening_resource_exhausted)
-      moves = self.__generate_moves(board, depth=depth)
-    else:
-      moves = self.__generate_moves(board)
+
+    if (self.iterdeepening and self.time_manager == None
+        and self.nvisited >= self.maximum_visited):
+      raise TerminationException(iter_deepening_resource_exhausted)
+
+    moves = self.__generate_moves(board, ply, tt_move=tt_move)
     
     if not moves:
       if self.iterdeepening:
@@ -246,19 +602,71 @@ class AlphaBetaPruning(MinimaxUtility):
     
     return None, moves
 
-  def __update_move_path(self, path, value, is_max=True):
-    if is_max:
-      if self.move_path[0] == None or value > self.move_path[0]:
-        self.move_path[0] = value
-        self.move_path[1] = [path]
-      elif value == self.move_path[0]:
-        self.move_path[1].append(path)
-    else:
-      if self.move_path[0] == None or value < self.move_path[0]:
-        self.move_path[0] = value
-        self.move_path[1] = [path]
-      elif value == self.move_path[0]:
-        self.move_path[1].append(path)
+  def __check_stop(self):
+    """
+    Called on entering every node, and by the endgame solver for every
+    position it solves: stop the search once it was aborted or the hard
+    deadline has passed. The clock is read every check_every calls, 
+    whatever path the node returns by.
+    """
+    if self.abort_search:
+      raise TerminationException(search_aborted, msg="search aborted")
+    if self.time_manager != None and self.time_manager.check():
+      raise TerminationException(iter_deepening_time_exhausted,
+                                 msg="iterative deepening out of time")
+
+  def __clear_pv(self, ply):
+    """
+    Empty the best line from ply, on entering a node.
+    """
+    if ply < max_ply:
+      self.pv_length[ply] = ply
+
+  def __update_pv(self, ply, move):
+    """
+    move improved the window at ply: the best line from ply becomes move
+    followed by the best line of the child.
+    """
+    if ply >= max_ply:
+      return
+    line = self.pv[ply]
+    line[ply] = move
+    length = ply + 1
+    if length < max_ply:
+      child_length = self.pv_length[length]
+      line[length:child_length] = self.pv[length][length:child_length]
+      length = max(child_length, length)
+    self.pv_length[ply] = length
+
+  def __exact_value(self, board, result):
+    """
+    Value of a solved board from the point of view of self.side.
+    :param result: WIN, DRAW or LOSS for the side to move of board
+    """
+    value = result * endgame_win_score
+    if board.to_move != self.side:
+      return -value
+    return value
+
+  def __leaf_values(self, board, depth, ply, moves):
+    """
+    Values of the leaves below a node evaluated all at once, when the
+    node is at depth 1 and batched evaluation is enabled and no exact
+    value can apply to its children.
+    :return: a list of values for self.side in the order of moves, or
+             None to search the children one by one
+    """
+    if not self.batch_eval or depth != 1:
+      return None
+    children_empties = empty_count(board) - 1
+    if self.endgame_solver != None and children_empties <= self.endgame:
+      return None
+    if (self.tablebase != None 
+        and children_empties <= self.tablebase.empties):
+      return None
+    # the children would have emptied their line
+    self.__clear_pv(ply + 1)
+    return board.evaluate_moves(moves)
 
   def __eval(self, board):
     """
@@ -267,38 +675,63 @@ class AlphaBetaPruning(MinimaxUtility):
     """
     return board.evaluate()
 
-  def __generate_moves(self, board, depth=None):
+  def __generate_moves(self, board, ply, tt_move=None):
     """
-    Generate a list of possible moves based on board. If current_depth
-    is provided, it will reorder the killer moves at current depth
-    to the beginning of returned move list.
+    Generate a list of possible moves based on board, sorted once for 
+    searching: the best move stored in the transposition table first,
+    then the killer moves of this ply, then by history score.
     """
     moves = board.gen_moves() # [(move1, nlib1), (move2, nlib2), ...]
-    tmp = list(zip(*moves)) # [(move1, move2, ...), (nlib1, nlib2, ...)]
 
     if not moves:
       return []
 
-    if depth != None and depth < len(self.killer_moves):
-      assert depth <= len(self.killer_moves)
-      index = len(self.killer_moves) - depth 
-      for killer_move in self.killer_moves[index]:
-        if killer_move in tmp[0]:
-          i = tmp[0].index(killer_move) # index of (killer_move, nlib) in moves
-          removed = moves.pop(i)  # remove it from its original position
-          moves.insert(0, removed)  # re-add it to the beginning of moves
-    
+    killers = self.killers[ply] if ply < max_ply else (None, None)
+    history = self.history
+
+    def score(item):
+      move = item[0]
+      if move == tt_move:
+        return tt_move_score
+      if move == killers[0]:
+        return killer_move_score + 1
+      if move == killers[1]:
+        return killer_move_score
+      return history[move.x * 5 + move.y]
+
+    moves.sort(key=score, reverse=True)
     return moves
 
-  def __generate_killer_moves(self, d):
+  def __cutoff(self, ply, depth, move, index):
+    """
+    Record a cutoff caused by move, the index-th move searched at ply:
+    move becomes the first killer of the ply, and its square earns 
+    history score.
+    """
+    self.npruned += 1
+    if index == 0:
+      self.nfirstcutoffs += 1
+    if ply < max_ply:
+      killers = self.killers[ply]
+      if killers[0] != move:
+        killers[1] = killers[0]
+        killers[0] = move
+    self.history[move.x * 5 + move.y] += depth * depth
+
+  def __age_move_ordering(self):
     """
-    Based on move path, generate a list of killer moves at each 
-    depth, the list is indexed by the depth number
+    Before a decision: shift the killer moves by the plies played since
+    the previous one, so they stay at the same distance from the root,
+    and halve the history scores so recent cutoffs weigh more.
     """
-    self.killer_moves = [set() for _ in range(d)]
-    for path in self.move_path[1]:
-      for i in range(len(path)):
-        self.killer_moves[i].add(path[i])
+    height = len(self.undo_stack)
+    if self.last_root_height != None:
+      shift = height - self.last_root_height
+      if shift > 0:
+        self.killers = (self.killers[shift:] 
+                        + [[None, None] for _ in range(min(shift, max_ply))])
+    self.last_root_height = height
+    self.history = [h >> 1 for h in self.history]
 
   @staticmethod
   def random_pick_move(moves):
@@ -306,50 +739,6 @@ class AlphaBetaPruning(MinimaxUtility):
     pick_move = random.randint(0, len(moves) - 1) 
     return moves[pick_move]
 
-  @staticmethod
-  def board_after_moving(board, move, zobrist_table=None):
-    """
-    Deepcopy a board(i.e. AlphaBetaPruning object), and try move,
-    and manually update Zobrist hash value for new board
-    :param board: AlphaBetaPruning object
-    :param move: Move object
-    :param zobrist_table: a zobrist table with initialized value, 
-                          or None if not specified 
-    :return: AlphaBetaPruning object after trying move, with new 
-             zobrist hash key
-    """
-    # deep copy current state
-    b = copy.deepcopy(board)
-    
-    # save original to_move, since try_move will change to_move to 
-    # opponent side
-    orig_to_move, orig_opp = b.to_move, b.opponent(b.to_move) 
-    
-    result, captured = b.try_move(move)
-    if result == ILLEGAL_MOVE:
-      raise Exception("illegal move in minimax")
-    
-    # now update Zobrist hash key manually
-    if zobrist_table:
-      for x, y in captured:
-        # xor OUT original opponent side stone
-        b.zobrist_key ^= zobrist_table[x][y][orig_opp - 1]
-        # xor IN original to_move side stone
-        b.zobrist_key ^= zobrist_table[x][y][orig_to_move - 1]
-      # xor IN original new stone (original to_move side)
-      b.zobrist_key ^= zobrist_table[move.x][move.y][orig_to_move - 1]
-    
-    return b
-
-  @staticmethod
-  def init_zobrist_table():
-    table = [[[0 for _ in range(2)] for _ in range(5)] for _ in range(5)]
-    for x in range(5):
-      for y in range(5):
-        for side in range(2):
-          table[x][y][side] = uuid.uuid4().int 
-    return table
-
   def __iter_deepening(self):
     """
     First, search 1 ply deep and record the best path of moves.
@@ -358,45 +747,120 @@ class AlphaBetaPruning(MinimaxUtility):
     """
     depth = 1
     stored_move = None
-    zobrist_table = AlphaBetaPruning.init_zobrist_table()
+    v = None
+    # moves of an aborted search are still on the board, take them back
+    # down to this height
+    root_height = len(self.undo_stack)
+    timed = self.time_manager != None
     
-    while self.nvisited < self.maximum_visited and depth <= 25:
+    while ((timed or self.nvisited < self.maximum_visited) 
+           and depth <= 25):
       try:
-        transposition = {}
-        self.move_path = [None, []]
-        v, move = self.__max_value(self, depth, -inf, inf, [], 
-                                   transposition=transposition, 
-                                   zobrist_table=zobrist_table)
+        if timed:
+          self.time_manager.iteration_started()
+        if v == None or self.aspiration_window <= 0:
+          v, move = self.__search_root(depth, -inf, inf)
+        else:
+          v, move = self.__aspiration_search(depth, v)
         stored_move = move
-        self.__print_moves(print_move_paths)
-        self.__generate_killer_moves(depth)
+        self.__print_moves(print_move_paths, v)
         if self.stop_deepening:
+          self.search_completed = True
           break
         if self.print_stats:
           print("at depth: ", depth, "value: ", v)
         self.__print_stats()
         self.__print_moves(print_killer_moves)
         depth += 1
+        if timed:
+          self.time_manager.iteration_finished()
+          if not self.time_manager.can_start_iteration():
+            if self.print_stats:
+              print("no time for depth: ", depth, "elapsed: ", 
+                    self.time_manager.elapsed())
+            self.search_completed = True
+            break
       except TerminationException as e:
+        while len(self.undo_stack) > root_height:
+          self.unmake_move()
         if e.code == iter_deepening_resource_exhausted:
           if self.print_stats:
             print("resource exhausted ..")
           return stored_move
+        if e.code == search_aborted:
+          return stored_move
+        if e.code == iter_deepening_time_exhausted:
+          if self.print_stats:
+            print("time exhausted at depth: ", depth, "elapsed: ", 
+                  self.time_manager.elapsed())
+          if stored_move is None:
+            # not even the first iteration finished, do not pass
+            return self.__static_move()
+          return stored_move
 
+    # deepest iteration done, or else the node budget ran out
+    self.search_completed = depth > 25
     return stored_move
 
+  def __aspiration_search(self, depth, guess):
+    """
+    Search the root with a narrow window around guess, the value of the
+    previous iteration. The side of the window the value falls out of 
+    is widened twice as far each time until the value falls inside.
+    :return: value and best move, as __search_root()
+    """
+    delta = self.aspiration_window
+    alpha, beta = guess - delta, guess + delta
+    while True:
+      v, move = self.__search_root(depth, alpha, beta)
+      if v <= alpha and alpha > -inf:
+        delta *= 2
+        alpha = max(guess - delta, -inf)
+      elif v >= beta and beta < inf:
+        delta *= 2
+        beta = min(guess + delta, inf)
+      else:
+        return v, move
+      self.naspiration_researched += 1
+      if self.print_stats:
+        print("aspiration window failed at depth: ", depth, 
+              "re-search with: ", alpha, beta)
+
   def __print_stats(self):
     if self.print_stats:
       print("number of states visited: ", self.nvisited - 1)
       print("number of returned by pruning: ", self.npruned)
       print("number of states hit ttable: ", self.nttablehit)
-
-  def __print_moves(self, which):
+      if self.npruned > 0:
+        print("cutoffs on first move: ", self.nfirstcutoffs, 
+              "rate: ", round(self.nfirstcutoffs / self.npruned, 3))
+      if self.search == "pvs":
+        print("number of pvs re-searches: ", self.nresearched)
+      if self.aspiration_window > 0:
+        print("number of aspiration re-searches: ", 
+              self.naspiration_researched)
+      print("number of ttable entries: ", len(self.ttable))
+      if self.tablebase != None:
+        print("number of states hit tablebase: ", self.ntablebasehit)
+      if self.endgame_solver != None:
+        print("number of endgame positions solved: ", 
+              self.endgame_solver.nsolved, 
+              "cached: ", len(self.endgame_solver))
+
+  def __print_moves(self, which, value=None):
     if self.print_stats and self.print_move_lists:
       if which == print_killer_moves:
         print("killer moves: ", 
-              [[str(m) for m in ms] for ms in self.killer_moves]) 
+              [[str(m) for m in ms if m is not None] 
+               for ms in self.killers if ms[0] is not None]) 
       elif which == print_move_paths:
-        print("move path: ", 
-              self.move_path[0], 
-              [[str(s) for s in ms] for ms in self.move_path[1]])
\ No newline at end of file
+        print("move path: ", value, 
+              [str(m) for m in self.principal_variation()])
+
+
+class BitAlphaBetaPruning(AlphaBetaPruning, BitBoard):
+  """
+  AlphaBetaPruning searching on the bitboard backend. The MRO puts
+  BitBoard in front of Board, so only the board primitives change.
+  """
+  pass
@@ -0,0 +1,79 @@
+# Evaluation of many positions at once with NumPy, for the leaves below
+# a depth 1 node. Positions are given as the stone bitmasks of board.py
+# and every step of MinimaxUtility.evaluate() is done on whole arrays of
+# them: popcounts through a lookup table, eyes through the same shifts
+# as bitboard.eye_bits().
+#
+# NumPy is optional: without it available() is False and the engine
+# evaluates leaves one by one.
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+from board import PLAYER_WHITE
+from bitboard import FULL, NOT_Y4, NOT_Y0
+
+
+def available():
+  return numpy is not None
+
+
+def init_popcount_table():
+  values = numpy.arange(1 << 16, dtype=numpy.int32)
+  table = numpy.zeros(1 << 16, dtype=numpy.int32)
+  for b in range(16):
+    table += (values >> b) & 1
+  return table
+
+POPCOUNT16 = init_popcount_table() if numpy is not None else None
+
+
+def popcount(bits):
+  return POPCOUNT16[bits & 0xffff] + POPCOUNT16[bits >> 16]
+
+
+def dilate(bits):
+  """
+  bitboard.dilate() of every element of an array.
+  """
+  return ((bits << 5)
+          | (bits >> 5)
+          | ((bits & NOT_Y4) << 1)
+          | ((bits & NOT_Y0) >> 1)) & FULL
+
+
+def evaluate_batch(black, white, side, eval_method, scoring):
+  """
+  Values of positions as MinimaxUtility.evaluate() computes them.
+  :param black: sequence of black stone bitmasks, one per position
+  :param white: sequence of white stone bitmasks
+  :param side: player the values are for
+  :return: a list of ints
+  """
+  return evaluate_arrays(numpy.array(black, dtype=numpy.uint32),
+                         numpy.array(white, dtype=numpy.uint32),
+                         side, eval_method, scoring).tolist()
+
+
+def evaluate_arrays(black, white, side, eval_method, scoring):
+  """
+  evaluate_batch() of uint32 arrays.
+  :return: an int64 array
+  """
+  score = ((popcount(black) - popcount(white)).astype(numpy.int64)
+           * scoring['stone'])
+  if eval_method == "eye":
+    empty = ~(black | white) & FULL
+    black_eyes = empty & ~dilate(~black & FULL)
+    white_eyes = empty & ~dilate(~white & FULL)
+    score = (score
+             + popcount(black_eyes) * scoring['black eye']
+             - popcount(white_eyes) * scoring['white eye'])
+  elif eval_method != "number":
+    raise Exception("unexpected evaluate method in minimax")
+
+  if side == PLAYER_WHITE:
+    score = -score
+  return score
@@ -0,0 +1,277 @@
+# Bitboard backend for the 5x5 Gothello board.
+#
+# Each side is stored as a 25-bit integer where cell (x, y) is bit
+# x * 5 + y, so the index order matches board[x][y] and gen_moves()
+# yields moves in the same order as the list-of-lists Board.
+
+from board import (Board, Move, PLAYER_BLACK, PLAYER_WHITE, OBSERVER)
+
+FULL = (1 << 25) - 1
+
+# cells that still have a neighbor in the +y / -y direction
+NOT_Y4 = sum(1 << (x * 5 + y) for x in range(5) for y in range(4))
+NOT_Y0 = sum(1 << (x * 5 + y) for x in range(5) for y in range(1, 5))
+
+
+def bit(x, y):
+  return 1 << (x * 5 + y)
+
+
+def coords(index):
+  return index // 5, index % 5
+
+
+# number of set bits, int.bit_count() from Python 3.10 on
+if hasattr(int, "bit_count"):
+  popcount = int.bit_count
+else:
+  def popcount(bits):
+    return bin(bits).count("1")
+
+
+def iter_bits(bits):
+  """
+  Iterate over the indices of set bits, lowest index first.
+  """
+  while bits:
+    low = bits & -bits
+    yield low.bit_length() - 1
+    bits ^= low
+
+
+def dilate(bits):
+  """
+  Cells orthogonally adjacent to any cell in bits (not including bits
+  itself unless a cell is adjacent to another one in the set).
+  """
+  return ((bits << 5)
+          | (bits >> 5)
+          | ((bits & NOT_Y4) << 1)
+          | ((bits & NOT_Y0) >> 1)) & FULL
+
+
+def init_neighbor_masks():
+  masks = []
+  for i in range(25):
+    masks.append(dilate(1 << i))
+  return tuple(masks)
+
+
+# NEIGHBORS[i] is the mask of cells orthogonally adjacent to cell i
+NEIGHBORS = init_neighbor_masks()
+
+# NEIGHBOR_CELLS[i] is the indices of the cells adjacent to cell i
+NEIGHBOR_CELLS = tuple(tuple(iter_bits(mask)) for mask in NEIGHBORS)
+
+# one Move per cell, shared by the move lists of gen_moves()
+CELL_MOVES = tuple(Move(i // 5, i % 5) for i in range(25))
+
+
+def eye_bits(own, empty):
+  """
+  Eyes of a player, all cells at once.
+  :param own: bitmask of the player's stones
+  :param empty: bitmask of the empty cells
+  :return: bitmask of the empty cells whose neighbors are all in own
+  """
+  return empty & ~dilate(FULL & ~own)
+
+
+def captures(own, opp, b):
+  """
+  Opponent stones captured by the stone b.
+  :param own: bitmask of the player's stones, b included
+  :param opp: bitmask of the opponent's stones
+  :return: bitmask of the opponent groups adjacent to b left without
+           liberty
+  """
+  empty = FULL & ~(own | opp)
+  captured = 0
+  candidates = dilate(b) & opp
+  while candidates:
+    group = flood(opp, candidates & -candidates)
+    candidates &= ~group
+    if not dilate(group) & empty:
+      captured |= group
+  return captured
+
+
+def is_single(bits):
+  """
+  Whether at most one bit is set.
+  """
+  return bits & (bits - 1) == 0
+
+
+def flood(stones, seed):
+  """
+  Grow seed through stones until the whole connected group is covered.
+  :param stones: bitmask of stones of one color
+  :param seed: bitmask of the starting stone(s), must be inside stones
+  :return: bitmask of the group
+  """
+  group = seed
+  while True:
+    grown = (group | dilate(group)) & stones
+    if grown == group:
+      return group
+    group = grown
+
+
+class BitBoard(Board):
+  """
+  Drop-in replacement of Board which works on the bitmask per side in
+  self.bits (indexed by PLAYER_BLACK / PLAYER_WHITE). self.board is
+  still kept up to date so code reading board[x][y] keeps working, but
+  liberties, captures, move generation and referee only use the masks.
+  """
+
+  def __init__(self):
+    super().__init__()
+    # liberties come from the masks, Board's chains are not kept
+    self.chains = None
+    self.chain_history = None
+
+  def empty_bits(self):
+    return FULL & ~(self.bits[PLAYER_BLACK] | self.bits[PLAYER_WHITE])
+
+  def liberties(self, x, y):
+    color = self.board[x][y]
+    group = flood(self.bits[color], bit(x, y))
+    return popcount(dilate(group) & self.empty_bits())
+
+  def move_ok(self, move):
+    """
+    Same contract as Board.move_ok, computed on the bitmasks.
+    """
+    if move.is_pass:
+      return (True, -1)
+    b = bit(move.x, move.y)
+    if not self.empty_bits() & b:
+      return (False, -1)
+    n = popcount(self.__placed_liberties(b))
+    if n == 0:
+      return (False, n)
+    return (True, n)
+
+  def placed_liberties(self, x, y):
+    """
+    Same contract as Board.placed_liberties, computed on the bitmasks.
+    """
+    libs = self.__placed_liberties(bit(x, y))
+    return set(coords(i) for i in iter_bits(libs))
+
+  def __placed_liberties(self, b):
+    """
+    :return: bitmask of the liberties of the group of a stone of the 
+             side to move placed at the empty cell b, before captures
+    """
+    own = self.bits[self.to_move] | b
+    empty = FULL & ~(own | self.bits[self.opponent(self.to_move)])
+    return dilate(flood(own, b)) & empty
+
+  def gen_moves(self):
+    """
+    Same contract as Board.gen_moves. The liberties of each group of
+    the side to move are found once, then every empty cell adds up its
+    empty neighbors and the liberties of the groups it touches.
+    """
+    own = self.bits[self.to_move]
+    empty = FULL & ~(own | self.bits[self.opponent(self.to_move)])
+    # group_libs[i] is the liberties of the group of own stone i, 0
+    # for other cells
+    group_libs = [0] * 25
+    rest = own
+    while rest:
+      group = flood(own, rest & -rest)
+      rest &= ~group
+      libs = dilate(group) & empty
+      for i in iter_bits(group):
+        group_libs[i] = libs
+
+    result = []
+    rest = empty
+    while rest:
+      low = rest & -rest
+      rest ^= low
+      i = low.bit_length() - 1
+      libs = NEIGHBORS[i] & empty
+      for j in NEIGHBOR_CELLS[i]:
+        libs |= group_libs[j]
+      libs &= ~low
+      if libs:
+        result.append((CELL_MOVES[i], popcount(libs)))
+    return result
+
+  def capture(self, x, y):
+    """
+    Attempt to capture the group at (x, y) for the side to move.
+    :return: a set of stone coords captured
+    """
+    color = self.board[x][y]
+    group = flood(self.bits[color], bit(x, y))
+    if dilate(group) & self.empty_bits():
+      return set()
+    self.__flip(group, color)
+    return set(coords(i) for i in iter_bits(group))
+
+  def do_captures(self, move):
+    captured = self.__capture_bits(bit(move.x, move.y))
+    return set(coords(i) for i in iter_bits(captured))
+
+  def __capture_bits(self, b):
+    """
+    Capture every opponent group adjacent to the stone b which has no
+    liberty left.
+    :return: bitmask of captured stones
+    """
+    opp = self.opponent(self.to_move)
+    captured = captures(self.bits[self.to_move], self.bits[opp], b)
+    if captured:
+      self.__flip(captured, opp)
+    return captured
+
+  def move_bits(self, move):
+    """
+    Same contract as Board.move_bits, without touching the board.
+    """
+    own, opp = self.bits[self.to_move], self.bits[self.opponent(self.to_move)]
+    if not move.is_pass:
+      b = bit(move.x, move.y)
+      own |= b
+      captured = captures(own, opp, b)
+      own |= captured
+      opp &= ~captured
+    if self.to_move == PLAYER_BLACK:
+      return (own, opp)
+    return (opp, own)
+
+  def __flip(self, stones, color):
+    self.bits[color] &= ~stones
+    self.bits[self.opponent(color)] |= stones
+    for i in iter_bits(stones):
+      x, y = coords(i)
+      self.board[x][y] = self.opponent(color)
+
+  def place_stone(self, move):
+    self.board[move.x][move.y] = self.to_move
+    self.bits[self.to_move] |= bit(move.x, move.y)
+    return self.do_captures(move)
+
+  def remove_stone(self, move, captured):
+    stones = 0
+    for x, y in captured:
+      stones |= bit(x, y)
+    if stones:
+      self.__flip(stones, self.to_move)
+    self.bits[self.to_move] &= ~bit(move.x, move.y)
+    self.board[move.x][move.y] = 0
+
+  def referee(self):
+    nblack = popcount(self.bits[PLAYER_BLACK])
+    nwhite = popcount(self.bits[PLAYER_WHITE])
+    if nblack > nwhite:
+      return PLAYER_BLACK
+    if nwhite > nblack:
+      return PLAYER_WHITE
+    return OBSERVER
@@ -2,6 +2,8 @@
 # https://github.com/pdx-cs-ai/gothello-gthd/blob/master/Board.java
 # I translated the Java code to Python code
 
+import random
+
 PLAYER_BLACK = 1  
 PLAYER_WHITE = 2
 OBSERVER = 3
@@ -10,6 +12,10 @@ GAME_OVER = 1
 CONTINUE = 0
 ILLEGAL_MOVE = -1
 
+# fixed seed, so keys are the same in every process and can be stored
+# in files
+ZOBRIST_SEED = 29068
+
 class Move:
 
   def __init__(self, x, y, is_pass=False):
@@ -68,6 +74,8 @@ class Move:
       return "pass"
 
   def __eq__(self, other):
+    if not isinstance(other, Move):
+      return NotImplemented
     if (self.x == other.x 
         and self.y == other.y 
         and self.is_pass == other.is_pass):
@@ -78,15 +86,154 @@ class Move:
     return hash(tuple([self.x, self.y, self.is_pass]))
 
 
+def init_adjacent():
+  """
+  ADJACENT[x][y] is a tuple of the on-board coords next to (x, y)
+  """
+  table = [[None for _ in range(5)] for _ in range(5)]
+  for x in range(5):
+    for y in range(5):
+      table[x][y] = tuple((i, j) 
+                          for i, j in ((x - 1, y), (x + 1, y), 
+                                       (x, y - 1), (x, y + 1))
+                          if i >= 0 and i <= 4 and j >= 0 and j <= 4)
+  return table
+
+ADJACENT = init_adjacent()
+
+
+def init_zobrist_table(seed=ZOBRIST_SEED):
+  """
+  Random 64-bit keys for Zobrist hashing.
+  :return: a tuple (stones, black_to_move, passed)
+           stones[x][y][player] is the key of a stone of player at 
+           (x, y), index 0 is unused
+           black_to_move is xored in when black is to move
+           passed is xored in when the previous move was a pass
+  """
+  rng = random.Random(seed)
+  stones = [[[0, rng.getrandbits(64), rng.getrandbits(64)] 
+             for _ in range(5)] 
+            for _ in range(5)]
+  return stones, rng.getrandbits(64), rng.getrandbits(64)
+
+ZOBRIST_STONES, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_PASSED = init_zobrist_table()
+
+# xoring this in turns a stone at (x, y) into one of the other color 
+ZOBRIST_FLIP = [[ZOBRIST_STONES[x][y][PLAYER_BLACK] 
+                 ^ ZOBRIST_STONES[x][y][PLAYER_WHITE] 
+                 for y in range(5)] 
+                for x in range(5)]
+
+
+def init_symmetries():
+  """
+  The 8 symmetries of the board (rotations and reflections) as 
+  permutations of the cell indices x * 5 + y.
+  :return: a tuple (permutations, inverses)
+           permutations[s][i] is the image of cell i by symmetry s, 
+           symmetry 0 is the identity
+           inverses[s] is the permutation undoing permutations[s]
+  """
+  transforms = [
+    lambda x, y: (x, y),
+    lambda x, y: (4 - x, y),
+    lambda x, y: (x, 4 - y),
+    lambda x, y: (4 - x, 4 - y),
+    lambda x, y: (y, x),
+    lambda x, y: (4 - y, x),
+    lambda x, y: (y, 4 - x),
+    lambda x, y: (4 - y, 4 - x)
+  ]
+  permutations, inverses = [], []
+  for t in transforms:
+    perm = [0 for _ in range(25)]
+    inverse = [0 for _ in range(25)]
+    for x in range(5):
+      for y in range(5):
+        i, j = t(x, y)
+        perm[x * 5 + y] = i * 5 + j
+        inverse[i * 5 + j] = x * 5 + y
+    permutations.append(tuple(perm))
+    inverses.append(tuple(inverse))
+  return tuple(permutations), tuple(inverses)
+
+SYMMETRIES, INVERSE_SYMMETRIES = init_symmetries()
+
+# SYM_STONES[s][i][player] and SYM_FLIP[s][i] are the Zobrist keys of 
+# cell i of the board seen through symmetry s
+SYM_STONES = tuple(tuple(ZOBRIST_STONES[perm[i] // 5][perm[i] % 5] 
+                         for i in range(25)) 
+                   for perm in SYMMETRIES)
+SYM_FLIP = tuple(tuple(ZOBRIST_FLIP[perm[i] // 5][perm[i] % 5] 
+                       for i in range(25)) 
+                 for perm in SYMMETRIES)
+
+
+def transform_move(move, sym):
+  """
+  Image of move by symmetry sym, passes and None are left alone.
+  """
+  if move is None or move.is_pass or sym == 0:
+    return move
+  x, y = divmod(SYMMETRIES[sym][move.x * 5 + move.y], 5)
+  return Move(x, y)
+
+
+def untransform_move(move, sym):
+  """
+  Reverse transform_move().
+  """
+  if move is None or move.is_pass or sym == 0:
+    return move
+  x, y = divmod(INVERSE_SYMMETRIES[sym][move.x * 5 + move.y], 5)
+  return Move(x, y)
+
+
+class Chain:
+  """
+  A maximal group of connected stones of one color, together with its
+  liberties. Chains are never modified once built: a move builds new 
+  chains for the groups it touches, so an old list of chains is still
+  a valid snapshot to restore on undo.
+  """
+  __slots__ = ('color', 'stones', 'liberties')
+
+  def __init__(self, color, stones, liberties):
+    self.color = color
+    self.stones = stones        # frozenset of coords
+    self.liberties = liberties  # frozenset of coords
+
+
 class Board:
 
   def __init__(self):
     self.to_move = PLAYER_BLACK
     self.board = [[0 for _ in range(5)] for _ in range(5)]
+    # one bitmask of stones per player, indexed like board cells: cell
+    # (x, y) is bit x * 5 + y
+    self.bits = [0, 0, 0]
     self.game_status = CONTINUE
     self.previous_move = None
     self.serial = 1
 
+    # Zobrist hash key of the position, kept up to date by make_move()
+    # and restored by unmake_move()
+    self.zobrist_key = self.compute_zobrist_key()
+
+    # keys of the 8 symmetric images of the position, see 
+    # enable_symmetry(), or None when not kept up to date
+    self.sym_keys = None
+
+    # one record per move done by make_move(), see unmake_move()
+    self.undo_stack = []
+
+    # chains[x * 5 + y] is the Chain of the stone at (x, y), or None
+    # for an empty cell; chain_history holds the chains replaced by 
+    # each place_stone() 
+    self.chains = [None for _ in range(25)]
+    self.chain_history = []
+
   def __str__(self):
     ret = ""
     for row in self.board:
@@ -109,6 +256,63 @@ class Board:
       return PLAYER_BLACK
     raise Exception("internal error: bad player")
 
+  def compute_zobrist_key(self):
+    """
+    Zobrist hash key of the current position computed from scratch:
+    stones, side to move, and whether the previous move was a pass
+    """
+    key = 0
+    for x in range(5):
+      for y in range(5):
+        if self.board[x][y] != 0:
+          key ^= ZOBRIST_STONES[x][y][self.board[x][y]]
+    if self.to_move == PLAYER_BLACK:
+      key ^= ZOBRIST_BLACK_TO_MOVE
+    if self.previous_move is not None and self.previous_move.is_pass:
+      key ^= ZOBRIST_PASSED
+    return key
+
+  def compute_sym_keys(self):
+    """
+    Keys of the position seen through each symmetry, computed from 
+    scratch. Key 0 is zobrist_key.
+    """
+    common = self.zobrist_key
+    for x in range(5):
+      for y in range(5):
+        if self.board[x][y] != 0:
+          common ^= ZOBRIST_STONES[x][y][self.board[x][y]]
+    keys = []
+    for stones in SYM_STONES:
+      key = common
+      for x in range(5):
+        for y in range(5):
+          if self.board[x][y] != 0:
+            key ^= stones[x * 5 + y][self.board[x][y]]
+      keys.append(key)
+    return tuple(keys)
+
+  def enable_symmetry(self):
+    """
+    Keep the keys of the symmetric images up to date from now on, which
+    makes canonical_key() cheap.
+    """
+    self.sym_keys = self.compute_sym_keys()
+
+  def canonical_key(self):
+    """
+    Key shared by the position and all its rotations and reflections:
+    the smallest key of its 8 images.
+    :return: a tuple (key, sym) where sym is the symmetry taking the
+             position to the image the key belongs to, moves of the
+             position map to that image with transform_move(move, sym)
+    """
+    keys = self.sym_keys
+    if keys is None:
+      keys = self.compute_sym_keys()
+    key = min(keys)
+    return key, keys.index(key)
+
   def scratch_board(self):
     return [[False for _ in range(5)] for _ in range(5)]
 
@@ -138,7 +342,7 @@ class Board:
       return True
     return False
 
-  def liberties(self, x, y):
+  def scan_liberties(self, x, y):
     scratch = self.scratch_board()
     self.flood(scratch, self.board[x][y], x, y)
     n = 0
@@ -148,6 +352,28 @@ class Board:
           n += 1
     return n
 
+  def liberties(self, x, y):
+    chain = self.chains[x * 5 + y]
+    if chain is not None and chain.color == self.board[x][y]:
+      return len(chain.liberties)
+    return self.scan_liberties(x, y)
+
+  def placed_liberties(self, x, y):
+    """
+    Liberties the group of a stone of the side to move would have if
+    it was placed at the empty cell (x, y), before any capture.
+    :return: a set of coords
+    """
+    libs = set()
+    for i, j in ADJACENT[x][y]:
+      color = self.board[i][j]
+      if color == 0:
+        libs.add((i, j))
+      elif color == self.to_move:
+        libs |= self.chains[i * 5 + j].liberties
+    libs.discard((x, y))
+    return libs
+
   def move_ok(self, move):
     """
     Check whether a move is valid based on current board.
@@ -161,9 +387,7 @@ class Board:
       return (True, -1)
     if self.board[move.x][move.y] != 0:
       return (False, -1)
-    self.board[move.x][move.y] = self.to_move    
-    n = self.liberties(move.x, move.y)
-    self.board[move.x][move.y] = 0
+    n = len(self.placed_liberties(move.x, move.y))
     if n == 0:
       return (False, n)
     return (True, n)
@@ -184,6 +408,16 @@ class Board:
             result.append((m, nlib))
     return result
 
+  def move_bits(self, move):
+    """
+    Stone bitmasks the board would have after move.
+    :return: a tuple (black bits, white bits)
+    """
+    self.make_move(move)
+    result = (self.bits[PLAYER_BLACK], self.bits[PLAYER_WHITE])
+    self.unmake_move()
+    return result
+
   def has_moves(self):
     ms = self.gen_moves()
     if ms:
@@ -204,41 +438,195 @@ class Board:
       for j in range(5):
         if scratch[i][j]:
           self.board[i][j] = self.to_move
-          captured.add((x, y))
+          captured.add((i, j))
+    self.rebuild_chains()
+    self.rebuild_bits()
     return captured
 
   def do_captures(self, move):
     """
-    Captures opponent stones based on move argument
+    Captures opponent stones based on move argument. The stone at move
+    must already be placed, and its chain built.
     :return: a set of stone coords captured
     """
+    opp = self.opponent(self.to_move)
+    p = (move.x, move.y)
     captured = set()
-    if move.x > 0 and self.board[move.x - 1][move.y] == self.opponent(self.to_move):
-      captured |= self.capture(move.x - 1, move.y)
-    if move.x < 4 and self.board[move.x + 1][move.y] == self.opponent(self.to_move):
-      captured |= self.capture(move.x + 1, move.y)
-    if move.y > 0 and self.board[move.x][move.y - 1] == self.opponent(self.to_move):
-      captured |= self.capture(move.x, move.y - 1)
-    if move.y < 4 and self.board[move.x][move.y + 1] == self.opponent(self.to_move):
-      captured |= self.capture(move.x, move.y + 1)
+    for x, y in ADJACENT[move.x][move.y]:
+      if self.board[x][y] != opp:
+        continue
+      chain = self.chains[x * 5 + y]
+      if p not in chain.liberties:
+        continue  # same chain met from another side
+      libs = chain.liberties - {p}
+      if libs:
+        self.set_chain(Chain(opp, chain.stones, libs))
+      else:
+        captured |= chain.stones
+        for i, j in chain.stones:
+          self.board[i][j] = self.to_move
+    if captured:
+      # captured stones join the chain of the new stone, together with
+      # every other chain of ours they touch 
+      chain = self.chains[move.x * 5 + move.y]
+      stones = set(chain.stones) | captured
+      libs = set(chain.liberties)
+      for x, y in captured:
+        for i, j in ADJACENT[x][y]:
+          if self.board[i][j] == self.to_move and (i, j) not in stones:
+            other = self.chains[i * 5 + j]
+            stones |= other.stones
+            libs |= other.liberties
+      self.set_chain(Chain(self.to_move, frozenset(stones), frozenset(libs)))
+      self.__flip_bits(captured, opp)
     return captured
 
+  def __flip_bits(self, stones, color):
+    mask = 0
+    for x, y in stones:
+      mask |= 1 << (x * 5 + y)
+    self.bits[color] &= ~mask
+    self.bits[self.opponent(color)] |= mask
+
+  def rebuild_bits(self):
+    """
+    Build the bitmasks from board, for when board was changed by 
+    something else than place_stone()
+    """
+    self.bits = [0, 0, 0]
+    for x in range(5):
+      for y in range(5):
+        if self.board[x][y] != 0:
+          self.bits[self.board[x][y]] |= 1 << (x * 5 + y)
+
+  def set_chain(self, chain):
+    for x, y in chain.stones:
+      self.chains[x * 5 + y] = chain
+
+  def rebuild_chains(self):
+    """
+    Build every chain from scratch, for when board was changed by 
+    something else than place_stone()
+    """
+    self.chains = [None for _ in range(25)]
+    for x in range(5):
+      for y in range(5):
+        if self.board[x][y] != 0 and self.chains[x * 5 + y] is None:
+          scratch = self.scratch_board()
+          self.flood(scratch, self.board[x][y], x, y)
+          stones = frozenset((i, j) 
+                             for i in range(5) 
+                             for j in range(5) if scratch[i][j])
+          libs = frozenset((i, j) 
+                           for i in range(5) 
+                           for j in range(5) 
+                           if self.board[i][j] == 0 
+                              and self.group_border(scratch, i, j))
+          self.set_chain(Chain(self.board[x][y], stones, libs))
+
+  def place_stone(self, move):
+    """
+    Put a stone of the side to move at move, and do captures
+    :param move: a Move object, not a pass
+    :return: a set of stone coords captured
+    """
+    self.chain_history.append(self.chains)
+    self.chains = list(self.chains)
+    libs = self.placed_liberties(move.x, move.y)
+    stones = {(move.x, move.y)}
+    for x, y in ADJACENT[move.x][move.y]:
+      if self.board[x][y] == self.to_move:
+        stones |= self.chains[x * 5 + y].stones
+    self.board[move.x][move.y] = self.to_move
+    self.bits[self.to_move] |= 1 << (move.x * 5 + move.y)
+    self.set_chain(Chain(self.to_move, frozenset(stones), frozenset(libs)))
+    return self.do_captures(move)
+
+  def remove_stone(self, move, captured):
+    """
+    Reverse place_stone(): take the stone at move off the board and
+    give the captured stones back to the opponent of the side to move
+    """
+    opp = self.opponent(self.to_move)
+    for x, y in captured:
+      self.board[x][y] = opp
+    if captured:
+      self.__flip_bits(captured, self.to_move)
+    self.board[move.x][move.y] = 0
+    self.bits[self.to_move] &= ~(1 << (move.x * 5 + move.y))
+    self.chains = self.chain_history.pop()
+
   def make_move(self, move):
     """
-    Make a move on the current board based on the argument move,
-    and do captures
+    Make a move in place based on the argument move: place the stone,
+    do captures and hand the turn to the opponent. Legality is not 
+    checked here, see try_move(). The replaced state is pushed on the
+    undo stack so that unmake_move() can restore it.
     :param move: a Move object
-    :return: a set of stone coords captured
+    :return: a set of stone coords captured, or None for a pass
     """
-    self.previous_move = move
+    captured = None
+    # what does not depend on where stones are
+    common = ZOBRIST_BLACK_TO_MOVE
     if move.is_pass:
-      return 
-    self.board[move.x][move.y] = self.to_move
-    captured = self.do_captures(move)
-    if (move.x, move.y) in captured:
-      captured.remove((move.x, move.y))
+      common ^= ZOBRIST_PASSED
+    if self.previous_move is not None and self.previous_move.is_pass:
+      common ^= ZOBRIST_PASSED
+    key = self.zobrist_key ^ common
+    if not move.is_pass:
+      captured = self.place_stone(move)
+      key ^= ZOBRIST_STONES[move.x][move.y][self.to_move]
+      for x, y in captured:
+        key ^= ZOBRIST_FLIP[x][y]
+    self.undo_stack.append((move, 
+                            self.previous_move, 
+                            self.to_move, 
+                            self.serial, 
+                            self.zobrist_key, 
+                            self.sym_keys,
+                            captured))
+    self.zobrist_key = key
+    if self.sym_keys is not None:
+      self.sym_keys = self.__move_sym_keys(move, captured, common)
+    self.previous_move = move
+    self.to_move = self.opponent(self.to_move)
+    if self.to_move == PLAYER_BLACK:
+      self.serial += 1
     return captured
 
+  def __move_sym_keys(self, move, captured, common):
+    """
+    Keys of the symmetric images after move by the side to move.
+    """
+    if move.is_pass:
+      return tuple(key ^ common for key in self.sym_keys)
+    i = move.x * 5 + move.y
+    flipped = [x * 5 + y for x, y in captured]
+    keys = []
+    for s, key in enumerate(self.sym_keys):
+      key ^= common ^ SYM_STONES[s][i][self.to_move]
+      flips = SYM_FLIP[s]
+      for j in flipped:
+        key ^= flips[j]
+      keys.append(key)
+    return tuple(keys)
+
+  def unmake_move(self):
+    """
+    Take back the last move done by make_move() (or by a try_move()
+    which returned CONTINUE), restoring board, previous move, side to 
+    move, serial and hash key.
+    """
+    (move, 
+     self.previous_move, 
+     self.to_move, 
+     self.serial, 
+     self.zobrist_key, 
+     self.sym_keys,
+     captured) = self.undo_stack.pop()
+    if not move.is_pass:
+      self.remove_stone(move, captured)
+
   def try_move(self, move, debug=False):
     """
     Try move based on argument move.
@@ -265,10 +653,6 @@ class Board:
       print("move ok")
 
     captured = self.make_move(move)
-
-    self.to_move = self.opponent(self.to_move)
-    if self.to_move == PLAYER_BLACK:
-      self.serial += 1
     
     if debug:
       print("leaving try_move(): continue game")
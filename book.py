@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+
+# Opening book: the moves of a deep search over the first plies of the
+# game, computed offline once and stored in a memory mapped table (see
+# mmaptable.py) keyed by the canonical key of the position (see
+# Board.canonical_key()), so one entry serves all its rotations and
+# reflections.
+#
+# The book covers every position either side can reach in its first
+# plies when it plays the book moves itself, whatever the opponent does:
+# only the book move is followed at the positions of the side to move,
+# every reply is followed at the other ones.
+
+import argparse
+import multiprocessing
+
+from board import Move, ZOBRIST_SEED, transform_move, untransform_move
+from alphabetapruning import AlphaBetaPruning, BitAlphaBetaPruning, inf
+from mmaptable import MappedTable, write_table
+
+BOOK_MAGIC = b"GTBS"
+
+# canonical key, move index (x * 5 + y) in the canonical orientation, 
+# search depth, value for the side to move
+BOOK_RECORD = "<QBBh"
+
+# values outside a signed 16-bit field are clamped
+max_book_value = 32767
+
+
+class OpeningBook:
+
+  def __init__(self, path):
+    self.table = MappedTable(path, BOOK_MAGIC, ZOBRIST_SEED, BOOK_RECORD)
+
+  def __len__(self):
+    return len(self.table)
+
+  def lookup(self, board):
+    """
+    Book move of the current position of board.
+    :return: a legal Move, or None if the position is not in the book
+    """
+    key, sym = board.canonical_key()
+    entry = self.table.lookup(key)
+    if entry is None:
+      return None
+    x, y = divmod(entry[1], 5)
+    move = untransform_move(Move(x, y), sym)
+    if not board.move_ok(move)[0]:
+      # a hash collision
+      return None
+    return move
+
+  def close(self):
+    self.table.close()
+
+
+def search_position(args):
+  """
+  Search one book position.
+  :param args: a tuple (moves, engine_class, depth, options) where moves
+               lead from the empty board to the position
+  :return: a tuple (record, move) or None if there is no move to play
+  """
+  moves, engine_class, depth, options = args
+  engine = engine_class("black", depth=depth, symmetry=True, **options)
+  for move in moves:
+    engine.make_move(move)
+  engine.side = engine.to_move
+  move = engine.decision()
+  if move is None or move.is_pass:
+    return None
+  key, sym = engine.canonical_key()
+  value, _ = engine.ttable.probe(key, depth, -inf, inf)
+  value = max(-max_book_value, min(value, max_book_value))
+  stored = transform_move(move, sym)
+  record = (key, stored.x * 5 + stored.y, depth, value)
+  return record, move
+
+
+def build_book(path, plies, depth, engine_class=AlphaBetaPruning,
+               options={}, workers=1, verbose=False):
+  """
+  Search the positions of the first plies and write the book to path.
+  :param plies: the book covers positions with fewer moves played
+  :param depth: search depth of every book position
+  :param options: more keyword arguments of the engine
+  :return: the number of positions in the book
+  """
+  records = []
+  pool = multiprocessing.Pool(workers) if workers > 1 else None
+  try:
+    # lines of moves reaching each position of the current ply, keyed
+    # by the canonical key so transpositions and symmetric positions are
+    # searched once
+    for side_to_book in ("black", "white"):
+      level = {None: []}
+      for ply in range(plies):
+        booked = ply % 2 == (0 if side_to_book == "black" else 1)
+        following = {}
+        if booked:
+          tasks = [(moves, engine_class, depth, options)
+                   for moves in level.values()]
+          if pool != None:
+            results = pool.map(search_position, tasks)
+          else:
+            results = [search_position(t) for t in tasks]
+          for moves, result in zip(level.values(), results):
+            if result is None:
+              continue
+            record, move = result
+            records.append(record)
+            following[record[0]] = moves + [move]
+        elif ply + 1 < plies:
+          for moves in level.values():
+            board = engine_class("black", symmetry=True)
+            for move in moves:
+              board.make_move(move)
+            for move, _ in board.gen_moves():
+              board.make_move(move)
+              following[board.canonical_key()[0]] = moves + [move]
+              board.unmake_move()
+        if verbose:
+          print(side_to_book, "ply: ", ply, "positions: ", len(level),
+                "book entries: ", len(records))
+        level = following
+  finally:
+    if pool != None:
+      pool.terminate()
+      pool.join()
+
+  return write_table(path, BOOK_MAGIC, ZOBRIST_SEED, BOOK_RECORD, records)
+
+
+def main():
+  eval_methods = [
+    "number",
+    "eye"
+  ]
+
+  search_methods = [
+    "minimax",
+    "pvs"
+  ]
+
+  parser = argparse.ArgumentParser(description='gothello opening book')
+
+  parser.add_argument('--output',
+                      '-o',
+                      type=str,
+                      default="book.bin",
+                      help="file to write the book to")
+
+  parser.add_argument('--plies',
+                      '-n',
+                      type=int,
+                      default=4,
+                      help="number of plies from the start covered by \
+                            the book")
+
+  parser.add_argument('--depth',
+                      '-d',
+                      type=int,
+                      default=6,
+                      help="search depth of every book position")
+
+  parser.add_argument('--evaluate',
+                      '-e',
+                      type=str,
+                      choices=eval_methods,
+                      default=eval_methods[0],
+                      help="choose a static evaluate function")
+
+  parser.add_argument('--search',
+                      type=str,
+                      choices=search_methods,
+                      default=search_methods[1],
+                      help="choose a search method")
+
+  parser.add_argument('--workers',
+                      '-W',
+                      type=int,
+                      default=1,
+                      help="number of processes searching book positions")
+
+  args = parser.parse_args()
+
+  n = build_book(args.output,
+                 args.plies,
+                 args.depth,
+                 engine_class=BitAlphaBetaPruning,
+                 options={
+                   'eval_method': args.evaluate,
+                   'search': args.search
+                 },
+                 workers=args.workers,
+                 verbose=True)
+  print("positions in book: ", n)
+
+
+if __name__ == "__main__":
+  main()
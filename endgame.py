@@ -0,0 +1,135 @@
+# Exact solver for the last plies of a game.
+#
+# Once few empty cells are left the whole game tree is small, so instead
+# of stopping at a heuristic evaluation the solver plays every line out
+# to the end of the game and asks referee() who won. Unlike the search,
+# passes are tried at every node: a player may pass at any time, and
+# two passes in a row end the game. Stones are never taken off the
+# board, so every line ends within a few plies.
+
+from board import Move, PLAYER_BLACK, PLAYER_WHITE, OBSERVER
+
+from bitboard import FULL, popcount
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+PASS = Move(0, 0, is_pass=True)
+
+
+def empty_count(board):
+  return popcount(FULL & ~(board.bits[PLAYER_BLACK]
+                           | board.bits[PLAYER_WHITE]))
+
+
+class EndgameSolver:
+
+  def __init__(self, max_entries=1000000):
+    # zobrist key -> WIN, DRAW or LOSS for the side to move, kept for
+    # the whole game since results never change
+    self.cache = {}
+    self.max_entries = max_entries
+
+    # test-purpose -- how many positions have been solved
+    self.nsolved = 0
+
+  def __len__(self):
+    return len(self.cache)
+
+  def solve(self, board, check=None):
+    """
+    Result of the game from board with perfect play of both sides.
+    :param board: a Board, left as it was
+    :param check: None, or a function called for every position solved
+                  which raises to stop solving, leaving the moves it 
+                  was trying on board
+    :return: WIN, DRAW or LOSS for the side to move
+    """
+    if board.sym_keys is None:
+      key = board.zobrist_key
+    else:
+      key, _ = board.canonical_key()
+    result = self.cache.get(key)
+    if result != None:
+      return result
+    if check != None:
+      check()
+    self.nsolved += 1
+
+    if empty_count(board) == 0:
+      # both sides can only pass
+      return self.__store(key, self.__outcome(board))
+
+    passed = (board.previous_move is not None
+              and board.previous_move.is_pass)
+    if passed:
+      # passing back ends the game right away
+      result = self.__outcome(board)
+      if result == WIN:
+        return self.__store(key, result)
+    else:
+      result = LOSS
+
+    for move, _ in board.gen_moves():
+      board.make_move(move)
+      value = -self.solve(board, check)
+      board.unmake_move()
+      if value > result:
+        result = value
+        if result == WIN:
+          return self.__store(key, result)
+
+    if not passed:
+      board.make_move(PASS)
+      value = -self.solve(board, check)
+      board.unmake_move()
+      result = max(result, value)
+
+    return self.__store(key, result)
+
+  def best_move(self, board, check=None):
+    """
+    Best move of the side to move, which may be a pass.
+    :param check: see solve()
+    :return: a tuple (result, move)
+    """
+    passed = (board.previous_move is not None
+              and board.previous_move.is_pass)
+    best, best_move = None, None
+    for move, _ in board.gen_moves():
+      board.make_move(move)
+      value = -self.solve(board, check)
+      board.unmake_move()
+      if best == None or value > best:
+        best, best_move = value, move
+        if best == WIN:
+          return best, best_move
+
+    if passed:
+      value = self.__outcome(board)
+    else:
+      board.make_move(PASS)
+      value = -self.solve(board, check)
+      board.unmake_move()
+    # only pass when it is strictly better than every move
+    if best == None or value > best:
+      best, best_move = value, PASS
+    return best, best_move
+
+  def __outcome(self, board):
+    """
+    Result for the side to move if the game ended now.
+    """
+    winner = board.referee()
+    if winner == OBSERVER:
+      return DRAW
+    if winner == board.to_move:
+      return WIN
+    return LOSS
+
+  def __store(self, key, result):
+    if len(self.cache) >= self.max_entries:
+      self.cache = {}
+    self.cache[key] = result
+    return result
@@ -0,0 +1,296 @@
+# Flags choosing and configuring an engine, shared by game.py and the
+# engine configurations of tournament.py and multigame.py, and the
+# engine they describe.
+
+from alphabetapruning import AlphaBetaPruning, BitAlphaBetaPruning
+from mcts import MonteCarloTreeSearch, BitMonteCarloTreeSearch
+from vectorminimax import VectorMinimax
+from timemanager import TimeManager
+from book import OpeningBook
+from tablebase import Tablebase
+
+eval_methods = [
+  "number",
+  "eye"
+]
+
+search_methods = [
+  "minimax",
+  "pvs"
+]
+
+engines = [
+  "alphabeta",
+  "mcts",
+  "vector"
+]
+
+# options only some engines use: given to another engine they are
+# rejected rather than silently ignored
+engine_options = {
+  'depth': ["alphabeta", "vector"],
+  'evaluate': ["alphabeta", "vector"],
+  'stonescore': ["alphabeta", "vector"],
+  'blackeyescore': ["alphabeta", "vector"],
+  'whiteeyescore': ["alphabeta", "vector"],
+  'moveselection': ["alphabeta", "vector"],
+  'iterdeepening': ["alphabeta"],
+  'maxnstate': ["alphabeta"],
+  'timed': ["alphabeta", "mcts"],
+  'movetime': ["alphabeta", "mcts"],
+  'ponder': ["alphabeta"],
+  'workers': ["alphabeta"],
+  'aspiration': ["alphabeta"],
+  'endgame': ["alphabeta"],
+  'book': ["alphabeta"],
+  'tablebase': ["alphabeta"],
+  'symmetry': ["alphabeta"],
+  'search': ["alphabeta"],
+  'batch': ["alphabeta"],
+  'playouts': ["mcts"],
+  'rave': ["mcts"],
+  'bitboard': ["alphabeta", "mcts"]
+}
+
+
+def add_engine_options(parser):
+  """
+  Add the flags of engine_options and --engine to parser.
+  """
+  parser.add_argument('--depth',
+                      '-d',
+                      type=int,
+                      default=4,
+                      help="depth limitation for minimax search \
+                            , not applied to iter deepening")
+
+  parser.add_argument('--evaluate',
+                      '-e',
+                      type=str,
+                      choices=eval_methods,
+                      default=eval_methods[0],
+                      help="choose a static evaluate function: (1)\
+                            \"number\" counts number of stones on each side; (2)\
+                            \"eye\" counts number of eyes and stones on each side")
+
+  parser.add_argument('--stonescore',
+                      '-S',
+                      type=int,
+                      default=1,
+                      help="assign a score for stone")
+
+  parser.add_argument('--blackeyescore',
+                      '-b',
+                      type=int,
+                      default=1,
+                      help="assign a score for black eye")
+
+  parser.add_argument('--whiteeyescore',
+                      '-w',
+                      type=int,
+                      default=1,
+                      help="assign a score for white eye")
+
+  parser.add_argument('--iterdeepening',
+                      '-i',
+                      action='store_true',
+                      help="enable iterative deepening, limited to \
+                            --maxnstate states per move, or by the \
+                            clock with --timed")
+
+  parser.add_argument('--moveselection',
+                      '-M',
+                      action='store_true',
+                      help="select move with the largest liberties \
+                            when multiple moves with same evalutated\
+                            score encountered")
+
+  parser.add_argument('--maxnstate',
+                      '-m',
+                      type=int,
+                      default=1000,
+                      help="assign a number for maximum number \
+                            of states to visit in iterative deepening \
+                            (default: %(default)s)")
+
+  parser.add_argument('--timed',
+                      '-t',
+                      action='store_true',
+                      help="enable iterative deepening limited by \
+                            per move deadlines computed from the server \
+                            clock instead of the number of states")
+
+  parser.add_argument('--movetime',
+                      '-T',
+                      type=float,
+                      default=5.0,
+                      help="seconds to spend per move with --timed when \
+                            the server has no time controls")
+
+  parser.add_argument('--workers',
+                      '-W',
+                      type=int,
+                      default=1,
+                      help="number of processes searching root moves \
+                            in parallel")
+
+  parser.add_argument('--aspiration',
+                      '-a',
+                      type=int,
+                      default=0,
+                      help="half width of the aspiration window around \
+                            the previous iteration's value in iterative \
+                            deepening, 0 searches with a full window")
+
+  parser.add_argument('--endgame',
+                      '-E',
+                      type=int,
+                      default=0,
+                      help="solve positions with at most this many empty \
+                            squares exactly instead of evaluating them, \
+                            0 never")
+
+  parser.add_argument('--book',
+                      '-B',
+                      type=str,
+                      default=None,
+                      help="play the moves of an opening book file built \
+                            by book.py while the game is in it")
+
+  parser.add_argument('--tablebase',
+                      type=str,
+                      default=None,
+                      help="take the exact value of positions held by an \
+                            endgame tablebase file built by tablebase.py")
+
+  parser.add_argument('--symmetry',
+                      action='store_true',
+                      help="share transposition table and endgame cache \
+                            entries between rotations and reflections of \
+                            a position")
+
+  parser.add_argument('--search',
+                      type=str,
+                      choices=search_methods,
+                      default=search_methods[0],
+                      help="choose a search method: (1) \"minimax\" \
+                            alpha-beta with separate max and min nodes; \
+                            (2) \"pvs\" negamax principal variation search")
+
+  parser.add_argument('--batch',
+                      action='store_true',
+                      help="evaluate the leaves below each depth 1 node \
+                            together with NumPy")
+
+  parser.add_argument('--engine',
+                      type=str,
+                      choices=engines,
+                      default=engines[0],
+                      help="choose an engine: (1) \"alphabeta\" \
+                            depth limited search; (2) \"mcts\" Monte \
+                            Carlo tree search, limited by --playouts or \
+                            --timed; (3) \"vector\" full width minimax \
+                            computed a ply at a time with NumPy, for \
+                            shallow --depth")
+
+  parser.add_argument('--playouts',
+                      type=int,
+                      default=5000,
+                      help="number of playouts per move of the mcts \
+                            engine")
+
+  parser.add_argument('--rave',
+                      action='store_true',
+                      help="blend all-moves-as-first statistics into the \
+                            move values of the mcts engine")
+
+  parser.add_argument('--bitboard',
+                      action='store_true',
+                      help="use the bitboard backend for board \
+                            operations instead of the 5x5 list")
+
+
+def check_engine_options(parser, args):
+  """
+  Reject options given a value other than their default with an engine
+  which does not use them. Options parser does not have, like --ponder
+  outside game.py, are skipped.
+  :param args: the namespace returned by parser.parse_args()
+  """
+  for option, users in engine_options.items():
+    if option not in args:
+      continue
+    if (args.engine not in users 
+        and getattr(args, option) != parser.get_default(option)):
+      raise Exception("--{} does not apply to the {} engine".format(
+                      option, args.engine))
+
+
+def make_engine(config, side, seed=None, print_stats=False):
+  """
+  Build the engine described by the flags of add_engine_options().
+  Book and tablebase files are opened here, close_engine() closes them.
+  :param config: a dict of the flags, vars() of the parsed namespace
+  :param side: "black" or "white"
+  :param seed: random seed of the mcts engine
+  """
+  scoring = {
+              'stone': config['stonescore'],
+              'black eye': config['blackeyescore'],
+              'white eye': config['whiteeyescore']
+            }
+  time_manager = None
+  if config['timed']:
+    time_manager = TimeManager(move_time=config['movetime'])
+
+  if config['engine'] == "mcts":
+    engine = (BitMonteCarloTreeSearch if config['bitboard'] 
+              else MonteCarloTreeSearch)
+    return engine(side,
+                  maximum_playouts=config['playouts'],
+                  rave=config['rave'],
+                  time_manager=time_manager,
+                  print_stats=print_stats,
+                  seed=seed)
+  if config['engine'] == "vector":
+    return VectorMinimax(side,
+                         depth=config['depth'],
+                         eval_method=config['evaluate'],
+                         scoring=scoring,
+                         move_selection=config['moveselection'],
+                         print_stats=print_stats)
+
+  book = None
+  if config['book'] != None:
+    book = OpeningBook(config['book'])
+  tablebase = None
+  if config['tablebase'] != None:
+    tablebase = Tablebase(config['tablebase'])
+  engine = BitAlphaBetaPruning if config['bitboard'] else AlphaBetaPruning
+  return engine(side,
+                depth=config['depth'],
+                iterdeepening=config['iterdeepening'],
+                maximum_visited=config['maxnstate'], 
+                eval_method=config['evaluate'],
+                scoring=scoring,
+                move_selection=config['moveselection'],
+                print_stats=print_stats,
+                search=config['search'],
+                aspiration_window=config['aspiration'],
+                time_manager=time_manager,
+                workers=config['workers'],
+                endgame=config['endgame'],
+                book=book,
+                symmetry=config['symmetry'],
+                tablebase=tablebase,
+                batch_eval=config['batch'])
+
+
+def close_engine(engine):
+  """
+  Close the book and tablebase files make_engine() opened.
+  """
+  if getattr(engine, 'book', None) != None:
+    engine.book.close()
+  if getattr(engine, 'tablebase', None) != None:
+    engine.tablebase.close()
@@ -6,14 +6,21 @@ import argparse
 import gthclient
 
 from board import Board, Move, ILLEGAL_MOVE, CONTINUE, GAME_OVER
-from alphabetapruning import AlphaBetaPruning
+from ponder import Ponderer
+from engineoptions import add_engine_options, check_engine_options
+from engineoptions import make_engine, close_engine
+import parallel
 
 class Gothelo:
 
-  def __init__(self, method, client, side="black"):
+  def __init__(self, method, client, side="black", ponder=False):
     self.board = method
     self.client = client
     self.side = side
+
+    # search on the opponent's time, and the answer it may have ready
+    self.ponderer = Ponderer(method) if ponder else None
+    self.ready_move = None
     
   def play(self):
     print("*** game start ***\n" + str(self.board))
@@ -47,13 +54,25 @@ class Gothelo:
         if e.expression == 325 or e.expression == 326:
           print("game drawn")
           break
+    if self.ponderer != None:
+      self.ponderer.stop(None)
 
   def __make_my_move(self):
     if self.client.winner:
       print("winner: ", self.client.winner)
       return True
 
-    move = self.board.decision()
+    move, self.ready_move = self.ready_move, None
+    if move is not None and not self.board.move_ok(move)[0]:
+      move = None
+    if move is not None:
+      print("me: answer ready from pondering")
+    else:
+      if self.board.time_manager != None:
+        # my_time stays None when the server runs without time controls
+        self.board.time_manager.start(self.client.my_time, 
+                                      self.client.serial)
+      move = self.board.decision()
     if not move:
       move = Move(0, 0, is_pass=True)
     result, _ = self.board.try_move(move)
@@ -78,6 +97,9 @@ class Gothelo:
         print("game drawn")
         return True
 
+    if self.ponderer != None and self.client.winner == None:
+      self.ponderer.start()
+
     return False
 
   def __get_move(self):
@@ -93,6 +115,8 @@ class Gothelo:
       return True
 
     move = Move.parse_string(move)
+    if self.ponderer != None:
+      self.ready_move = self.ponderer.stop(move)
     result, _ = self.board.try_move(move)
     if result == ILLEGAL_MOVE:
       raise Exception("illegal move when receiving from server")
@@ -108,11 +132,6 @@ def main():
     "white"
   ]
 
-  eval_methods = [
-    "number",
-    "eye"
-  ]
-
   parser = argparse.ArgumentParser(description='gothello')
 
   parser.add_argument('--side',  
@@ -122,94 +141,31 @@ def main():
                       default=sides[0], 
                       help="choose a side to play")
 
-  parser.add_argument('--depth',
-                      '-d',
-                      type=int,
-                      default=4,
-                      help="depth limitation for minimax search \
-                            , not applied to iter deepening")
+  add_engine_options(parser)
 
-  parser.add_argument('--evaluate',
-                      '-e',
-                      type=str,
-                      choices=eval_methods,
-                      default=eval_methods[0],
-                      help="choose a static evaluate function: (1)\
-                            \"number\" counts number of stones on each side; (2)\
-                            \"eye\" counts number of eyes and stones on each side")
-
-  parser.add_argument('--stonescore',
-                      '-S',
-                      type=int,
-                      default=1,
-                      help="assign a score for stone")
-
-  parser.add_argument('--blackeyescore',
-                      '-b',
-                      type=int,
-                      default=1,
-                      help="assign a score for black eye")
-
-  parser.add_argument('--whiteeyescore',
-                      '-w',
-                      type=int,
-                      default=1,
-                      help="assign a score for white eye")
-
-  parser.add_argument('--iterdeepening',
-                      '-i',
+  parser.add_argument('--ponder',
+                      '-p',
                       action='store_true',
-                      help="enable iterative deepening \
-                            default maximum number of states \
-                            to visit is 1000")
-
-  parser.add_argument('--moveselection',
-                      '-M',
-                      action='store_true',
-                      help="select move with the largest liberties \
-                            when multiple moves with same evalutated\
-                            score encountered")
-
-  parser.add_argument('--maxnstate',
-                      '-m',
-                      type=int,
-                      default=1000,
-                      help="assign a number for maximum number \
-                            of states to visit in iterative deepening")
+                      help="keep searching while waiting for the \
+                            opponent's move")
 
   parser.add_argument('--stats',
                       action='store_true',
                       help="enable printing states info")
 
   args = parser.parse_args()
+  check_engine_options(parser, args)
 
   side = args.side
-  depth = args.depth
-  eval_function = args.evaluate
-  scoring = {
-              'stone': args.stonescore,
-              'black eye': args.blackeyescore,
-              'white eye': args.whiteeyescore
-            }
-  iterdeepening = args.iterdeepening
-  maximum_visit = args.maxnstate
-  move_selection = args.moveselection
-  print_stats = args.stats
+  method = make_engine(vars(args), side, print_stats=args.stats)
 
   client = gthclient.GthClient(side, "localhost", 0)
 
-  method = AlphaBetaPruning(side,
-                            depth=depth,
-                            iterdeepening=iterdeepening,
-                            maximum_visited=maximum_visit, 
-                            eval_method=eval_function,
-                            scoring=scoring,
-                            move_selection=move_selection,
-                            print_stats=print_stats)
-
-  game = Gothelo(method, client, side=side)
+  game = Gothelo(method, client, side=side, ponder=args.ponder)
   game.play()
   game.client.closeall()
+  parallel.shutdown()
+  close_engine(method)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,377 @@
+import collections
+import math
+import random
+import time
+
+from board import (Board, Move, PLAYER_BLACK, PLAYER_WHITE, OBSERVER)
+
+from bitboard import BitBoard, FULL, iter_bits
+
+# one Move object per cell, shared by every node and playout
+CELL_MOVES = tuple(Move(i // 5, i % 5) for i in range(25))
+PASS = Move(0, 0, is_pass=True)
+PASS_CELL = 25
+
+# node not expanded yet, see first_child
+UNEXPANDED = -1
+
+# playout results, for the player who made the move
+WIN_REWARD = 1.0
+DRAW_REWARD = 0.5
+
+
+def cell_move(cell):
+  if cell == PASS_CELL:
+    return PASS
+  return CELL_MOVES[cell]
+
+
+def move_cell(move):
+  if move.is_pass:
+    return PASS_CELL
+  return move.x * 5 + move.y
+
+
+class MonteCarloTreeSearch(Board):
+  """
+  UCT search, optionally with RAVE, playing through the same decision()
+  interface as AlphaBetaPruning. The tree lives in an arena: parallel
+  lists indexed by node number, the children of a node being a run of
+  consecutive nodes. The subtree of the moves actually played is kept
+  from one decision to the next.
+  """
+
+  def __init__(self,
+               side,
+               maximum_playouts=5000,
+               exploration=1.4,
+               rave=False,
+               rave_equivalence=300,
+               max_nodes=1000000,
+               time_manager=None,
+               print_stats=False,
+               seed=None):
+    super().__init__()
+
+    if side == "black":
+      self.side = PLAYER_BLACK
+    elif side == "white":
+      self.side = PLAYER_WHITE
+    else:
+      raise Exception("unexpected side")
+
+    # number of playouts per decision, unless a time manager is given
+    self.maximum_playouts = maximum_playouts
+
+    # constant of the UCT exploration term
+    self.exploration = exploration
+
+    # whether to blend all-moves-as-first statistics into the values,
+    # and the number of visits at which both weigh the same
+    self.rave = rave
+    self.rave_equivalence = rave_equivalence
+
+    # the tree is compacted to the current subtree past this size
+    self.max_nodes = max_nodes
+
+    # a TimeManager: playouts run until its soft deadline, its start()
+    # must be called before each decision()
+    self.time_manager = time_manager
+
+    self.print_stats = print_stats
+    self.rng = random.Random(seed)
+
+    # test-purpose -- playouts of the last decision
+    self.nplayouts = 0
+
+    self.__reset_tree()
+
+  def __reset_tree(self):
+    # node arena, see __new_node()
+    self.node_cell = []
+    self.parent = []
+    self.first_child = []
+    self.nchildren = []
+    self.visits = []
+    self.wins = []
+    self.rave_visits = []
+    self.rave_wins = []
+
+    self.root = self.__new_node(None, UNEXPANDED)
+    # undo stack height at the root
+    self.root_height = len(self.undo_stack)
+
+  def __new_node(self, cell, parent):
+    """
+    Append a node to the arena. Wins are counted for the player who
+    made the move leading to the node.
+    :return: the node number
+    """
+    self.node_cell.append(cell)
+    self.parent.append(parent)
+    self.first_child.append(UNEXPANDED)
+    self.nchildren.append(0)
+    self.visits.append(0)
+    self.wins.append(0.0)
+    self.rave_visits.append(0)
+    self.rave_wins.append(0.0)
+    return len(self.node_cell) - 1
+
+  def decision(self):
+    self.__follow_played_moves()
+    self.nplayouts = 0
+    start = time.monotonic()
+    reused = self.visits[self.root]
+
+    # one playout at least, so the root is expanded and a move is found
+    # even without time left
+    self.__iterate()
+    if self.time_manager != None:
+      deadline = self.time_manager.soft_deadline
+      while time.monotonic() < deadline:
+        self.__iterate()
+    else:
+      for _ in range(self.maximum_playouts - 1):
+        self.__iterate()
+
+    move = self.__best_move()
+    if self.print_stats:
+      elapsed = max(time.monotonic() - start, 1e-9)
+      print("number of playouts: ", self.nplayouts,
+            "per second: ", round(self.nplayouts / elapsed))
+      print("number of visits reused: ", reused)
+      print("number of tree nodes: ", len(self.node_cell))
+      if move is not None:
+        child = self.__child(self.root, move_cell(move))
+        print("move: ", move, "visits: ", self.visits[child],
+              "win rate: ", round(self.wins[child] / self.visits[child], 3))
+    return move
+
+  def __best_move(self):
+    """
+    Most visited move of the root, or None without any.
+    """
+    best, best_visits = None, -1
+    first = self.first_child[self.root]
+    if first == UNEXPANDED:
+      return None
+    for child in range(first, first + self.nchildren[self.root]):
+      if self.visits[child] > best_visits:
+        best, best_visits = child, self.visits[child]
+    if best is None:
+      return None
+    return cell_move(self.node_cell[best])
+
+  def __child(self, node, cell):
+    first = self.first_child[node]
+    if first == UNEXPANDED:
+      return None
+    for child in range(first, first + self.nchildren[node]):
+      if self.node_cell[child] == cell:
+        return child
+    return None
+
+  def __follow_played_moves(self):
+    """
+    Move the root down the tree along the moves played since the last
+    decision, or start a new tree if they left it.
+    """
+    height = len(self.undo_stack)
+    if height < self.root_height:
+      self.__reset_tree()
+      return
+    node = self.root
+    for record in self.undo_stack[self.root_height:]:
+      node = self.__child(node, move_cell(record[0]))
+      if node is None:
+        self.__reset_tree()
+        return
+    self.root = node
+    self.root_height = height
+    if len(self.node_cell) > self.max_nodes // 2:
+      self.__compact()
+
+  def __compact(self):
+    """
+    Copy the subtree of the root to a new arena, dropping the rest.
+    """
+    old = (self.node_cell, self.first_child, self.nchildren, self.visits,
+           self.wins, self.rave_visits, self.rave_wins)
+    (node_cell, first_child, nchildren, visits,
+     wins, rave_visits, rave_wins) = old
+    root = self.root
+    self.__reset_tree()
+    self.visits[0], self.wins[0] = visits[root], wins[root]
+
+    # breadth first, so children stay consecutive
+    queue = collections.deque([(root, 0)])
+    while queue:
+      old_node, new_node = queue.popleft()
+      first = first_child[old_node]
+      if first == UNEXPANDED:
+        continue
+      self.first_child[new_node] = len(self.node_cell)
+      self.nchildren[new_node] = nchildren[old_node]
+      for child in range(first, first + nchildren[old_node]):
+        n = self.__new_node(node_cell[child], new_node)
+        self.visits[n], self.wins[n] = visits[child], wins[child]
+        self.rave_visits[n] = rave_visits[child]
+        self.rave_wins[n] = rave_wins[child]
+        queue.append((child, n))
+
+  def __iterate(self):
+    """
+    One selection, expansion, playout and backpropagation.
+    """
+    node = self.root
+    path = [node]
+    # (player, cell) of every move of the simulation
+    played = []
+
+    while self.first_child[node] != UNEXPANDED:
+      if self.nchildren[node] == 0:
+        break  # game over
+      node = self.__select(node)
+      played.append((self.to_move, self.node_cell[node]))
+      self.make_move(cell_move(self.node_cell[node]))
+      path.append(node)
+
+    if self.first_child[node] == UNEXPANDED:
+      self.__expand(node)
+      if self.nchildren[node] > 0:
+        # children are in random order, the first one is as good as any
+        node = self.first_child[node]
+        played.append((self.to_move, self.node_cell[node]))
+        self.make_move(cell_move(self.node_cell[node]))
+        path.append(node)
+
+    in_tree = len(played)
+    winner = self.__playout(played)
+    for _ in range(in_tree):
+      self.unmake_move()
+    self.nplayouts += 1
+    self.__backpropagate(path, played, winner)
+
+  def __expand(self, node):
+    """
+    Create the children of node, the current position: every legal
+    move, or a pass without any. A pass after a pass ends the game, so
+    then the node gets no children.
+    """
+    moves = [move_cell(m) for m, _ in self.gen_moves()]
+    if not moves:
+      if self.previous_move is not None and self.previous_move.is_pass:
+        self.first_child[node] = len(self.node_cell)
+        self.nchildren[node] = 0
+        return
+      moves = [PASS_CELL]
+    self.rng.shuffle(moves)
+    self.first_child[node] = len(self.node_cell)
+    self.nchildren[node] = len(moves)
+    for cell in moves:
+      self.__new_node(cell, node)
+
+  def __select(self, node):
+    """
+    Child of node maximizing the UCT value, blended with its RAVE
+    value if enabled. Unvisited children come first.
+    """
+    first = self.first_child[node]
+    log_visits = math.log(max(self.visits[node], 1))
+    visits, wins = self.visits, self.wins
+    best, best_value = first, -1.0
+    for child in range(first, first + self.nchildren[node]):
+      n = visits[child]
+      if n == 0:
+        return child
+      value = wins[child] / n
+      if self.rave and self.rave_visits[child] > 0:
+        beta = math.sqrt(self.rave_equivalence
+                         / (3 * n + self.rave_equivalence))
+        rave_value = self.rave_wins[child] / self.rave_visits[child]
+        value = (1 - beta) * value + beta * rave_value
+      value += self.exploration * math.sqrt(log_visits / n)
+      if value > best_value:
+        best, best_value = child, value
+    return best
+
+  def __random_move(self):
+    """
+    Random legal move of the side to move, or None without any: empty
+    cells are tried in random order until one is legal.
+    """
+    empty = FULL & ~(self.bits[PLAYER_BLACK] | self.bits[PLAYER_WHITE])
+    cells = list(iter_bits(empty))
+    rng = self.rng
+    while cells:
+      k = rng.randrange(len(cells))
+      cell = cells[k]
+      cells[k] = cells[-1]
+      cells.pop()
+      move = CELL_MOVES[cell]
+      if self.move_ok(move)[0]:
+        return move
+    return None
+
+  def __playout(self, played):
+    """
+    Play random moves to the end of the game, appending them to played,
+    and take them back.
+    :return: the winner, as referee()
+    """
+    made = 0
+    while True:
+      move = self.__random_move()
+      if move is None:
+        if self.previous_move is not None and self.previous_move.is_pass:
+          break
+        move = PASS
+      played.append((self.to_move, move_cell(move)))
+      self.make_move(move)
+      made += 1
+    winner = self.referee()
+    for _ in range(made):
+      self.unmake_move()
+    return winner
+
+  def __backpropagate(self, path, played, winner):
+    """
+    Add the playout result to the nodes of path, and with RAVE to the
+    siblings of the path whose move the same player made later on.
+    """
+    def reward(player):
+      if winner == OBSERVER:
+        return DRAW_REWARD
+      return WIN_REWARD if winner == player else 0.0
+
+    for i, node in enumerate(path):
+      self.visits[node] += 1
+      if i > 0:
+        self.wins[node] += reward(played[i - 1][0])
+
+    if not self.rave:
+      return
+    # cells each player played from the i-th move of the simulation on
+    later = {PLAYER_BLACK: set(), PLAYER_WHITE: set()}
+    first_moves = {}
+    for i in range(len(played) - 1, -1, -1):
+      player, cell = played[i]
+      later[player].add(cell)
+      if i < len(path) - 1:
+        first_moves[i] = (player, set(later[player]))
+    for i in range(len(path) - 1):
+      node = path[i]
+      player, cells = first_moves[i]
+      r = reward(player)
+      first = self.first_child[node]
+      for child in range(first, first + self.nchildren[node]):
+        if self.node_cell[child] in cells:
+          self.rave_visits[child] += 1
+          self.rave_wins[child] += r
+
+
+class BitMonteCarloTreeSearch(MonteCarloTreeSearch, BitBoard):
+  """
+  MonteCarloTreeSearch playing out on the bitboard backend.
+  """
+  pass
@@ -1,6 +1,10 @@
 from board import (Board, Move, ILLEGAL_MOVE, CONTINUE, 
   GAME_OVER, PLAYER_BLACK, PLAYER_WHITE)
 
+from bitboard import (FULL, NEIGHBORS, bit, dilate, eye_bits, is_single, 
+  iter_bits)
+import batcheval
+
 class MinimaxUtility(Board):
 
   def __init__(self,
@@ -26,32 +30,125 @@ class MinimaxUtility(Board):
     # value for scoring board
     self.eval = scoring
 
+    self.reset_evaluation()
+
   def evaluate(self, adjust=False):
+    """
+    Value of the board for self.side, from the stone differential and 
+    eye counts kept up to date by place_stone() and remove_stone().
+    """
     evaluation = self.eval
 
-    def number():
-      score_number = self.__evaluate_number() * evaluation['stone']
-      if self.side == PLAYER_WHITE:
-        return -score_number
-      return score_number
-
-    def eyes():
-      ne_black, ne_white = self.__evaluate_eye()
-      score_eyes = (ne_black * evaluation['black eye'] 
-                    - ne_white * evaluation['white eye']) 
-      if self.side == PLAYER_WHITE:
-        return -score_eyes
-      return score_eyes
-              
     if self.evaluate_method == "number":
-      return number()
+      score = self.stone_difference * evaluation['stone']
 
     elif self.evaluate_method == "eye":
-      return number() + eyes()
+      score = (self.stone_difference * evaluation['stone']
+               + self.neyes[PLAYER_BLACK] * evaluation['black eye'] 
+               - self.neyes[PLAYER_WHITE] * evaluation['white eye'])
 
     else:
       raise Exception("unexpected evaluate method in minimax")
 
+    if self.side == PLAYER_WHITE:
+      return -score
+    return score
+
+  def evaluate_moves(self, moves):
+    """
+    Values evaluate() would return after each move, computed together
+    by batcheval.py (needs NumPy).
+    :param moves: a list of (move, nlib) as gen_moves() returns
+    :return: a list of values, in the order of moves
+    """
+    black, white = [], []
+    for move, _ in moves:
+      b, w = self.move_bits(move)
+      black.append(b)
+      white.append(w)
+    return batcheval.evaluate_batch(black, white, self.side, 
+                                    self.evaluate_method, self.eval)
+
+  def reset_evaluation(self):
+    """
+    Recompute the incremental evaluation from scratch, needed only if
+    self.board is changed by other means than place_stone() and 
+    remove_stone().
+    """
+    self.stone_difference = self.__evaluate_number()
+
+    # eye_owner[x * 5 + y] is the player (x, y) is an eye of, or 0
+    self.eye_owner = [0 for _ in range(25)]
+    self.neyes = [0, 0, 0]
+    if self.evaluate_method == "eye":
+      for i in range(25):
+        owner = self.__eye_owner(i)
+        self.eye_owner[i] = owner
+        self.neyes[owner] += 1
+
+  def place_stone(self, move):
+    captured = super().place_stone(move)
+    self.__update_evaluation(move, captured, 1)
+    return captured
+
+  def remove_stone(self, move, captured):
+    # the stone still tells who played it
+    color = self.board[move.x][move.y]
+    super().remove_stone(move, captured)
+    self.__update_evaluation(move, captured, -1, color)
+
+  def __update_evaluation(self, move, captured, sign, color=None):
+    """
+    Account for move and its captures being done (sign 1) or taken
+    back (sign -1): only the changed cells and the cells next to them
+    can change their eye status.
+    """
+    if color == None:
+      color = self.board[move.x][move.y]
+    change = sign * (1 + 2 * len(captured))
+    if color == PLAYER_BLACK:
+      self.stone_difference += change
+    else:
+      self.stone_difference -= change
+
+    if self.evaluate_method != "eye":
+      return
+    touched = bit(move.x, move.y)
+    for x, y in captured:
+      touched |= bit(x, y)
+    eye_owner, neyes = self.eye_owner, self.neyes
+    for i in iter_bits(touched | dilate(touched)):
+      owner = self.__eye_owner(i)
+      old = eye_owner[i]
+      if owner != old:
+        neyes[old] -= 1
+        neyes[owner] += 1
+        eye_owner[i] = owner
+
+  def __eye_owner(self, i):
+    """
+    Player whose stones fill every cell next to the empty cell i, or 0
+    if cell i is not an eye.
+    """
+    bits = self.bits
+    black, white = bits[PLAYER_BLACK], bits[PLAYER_WHITE]
+    if (black | white) >> i & 1:
+      return 0
+    neighbors = NEIGHBORS[i]
+    if not neighbors & ~black:
+      return PLAYER_BLACK
+    if not neighbors & ~white:
+      return PLAYER_WHITE
+    return 0
+
+  def eye_bits(self, side):
+    """
+    :return: bitmask of the eyes of side, see bitboard.eye_bits()
+    """
+    bits = self.bits
+    empty = FULL & ~(bits[PLAYER_BLACK] | bits[PLAYER_WHITE])
+    return eye_bits(bits[side], empty)
+
   def __evaluate_number(self):
     score = 0
     for row in self.board:
@@ -62,100 +159,47 @@ class MinimaxUtility(Board):
           score -= 1
     return score
 
-  def __evaluate_eye(self):
-    nblack = self.__count_eye(PLAYER_BLACK)
-    nwhite = self.__count_eye(PLAYER_WHITE)
-    return len(nblack), len(nwhite)
-
-  def __check_eye(self, x, y, side):
-    def check(x, y):
-      if x < 0 or x > 4 or y < 0 or y > 4:
-        return 0
-      if self.board[x][y] == side:
-        return 1
-      else:
-        return -1
-    if (check(x - 1, y) != -1
-        and check(x + 1, y) != -1
-        and check(x, y - 1) != -1
-        and check(x, y + 1) != -1):
-      return True 
-    return False
-
-  def __count_eye(self, side):
-    eye_coords = set()
-    for i in range(5):
-      for j in range(5):
-        if self.board[i][j] == 0:
-          if self.__check_eye(i, j, side):
-            eye_coords.add((i, j))
-    return eye_coords
-
   def avoid_opponent_eye(self, moves):
+    """
+    Split moves by whether they fill an opponent's (near) eye without 
+    making an eye of ours next to it.
+    :return: a list of moves to keep, and a list of the other moves
+    """
     if not moves:
       return [], []
 
-    def check_my_eye(x, y):
-      if self.__check_eye(x, y, self.to_move):
-        return True
-      return False
-
+    own = self.bits[self.to_move]
     result = set()
     remained = set()
     for move in moves:
-      added = False
       if self.__detect_opponent_eye(move):
-        x, y = move.x, move.y
-        self.board[x][y] = self.to_move # move to (x,y) temporarily
-        if x > 0 and self.board[x - 1][y] != self.to_move:
-          if check_my_eye(x - 1, y):
-            result.add(move)
-            added = True
-        if x < 4 and self.board[x + 1][y] != self.to_move:
-          if check_my_eye(x + 1, y):
-            result.add(move)
-            added = True
-        if y > 0 and self.board[x][y - 1] != self.to_move:
-          if check_my_eye(x, y - 1):
-            result.add(move)
-            added = True
-        if y < 4 and self.board[x][y + 1] != self.to_move:
-          if check_my_eye(x, y + 1):
-            result.add(move)
-            added = True 
-        if not added:
+        # cells next to move, not ours, all of whose neighbors would be
+        # ours once move is played
+        placed = own | bit(move.x, move.y)
+        made = eye_bits(placed, NEIGHBORS[move.x * 5 + move.y] & ~placed)
+        if made:
+          result.add(move)
+        else:
           remained.add(move)
-        self.board[x][y] = 0  # recover to original value
       else:
         result.add(move)
     
     return list(result), list(remained)
 
   def __detect_opponent_eye(self, move):
+    """
+    Whether the cell of move is surrounded by opponent stones and the 
+    board edge on at least three sides.
+    """
     assert not move.is_pass
 
-    count = 0
     x, y = move.x, move.y
 
-    assert (self.board[x][y] == 0 
-            and x >= 0 
+    assert (x >= 0 
             and x <= 4 
             and y >= 0 
-            and y <= 4)
-            
-    if x == 0 or x == 4:
-      count += 1
-    if y == 0 or y == 4:
-      count += 1
-    if x > 0 and self.board[x - 1][y] == self.opponent(self.to_move):
-      count += 1
-    if x < 4 and self.board[x + 1][y] == self.opponent(self.to_move):
-      count += 1
-    if y > 0 and self.board[x][y - 1] == self.opponent(self.to_move):
-      count += 1
-    if y < 4 and self.board[x][y + 1] == self.opponent(self.to_move):
-      count += 1
-
-    if count >= 3:
-      return True
-    return False
+            and y <= 4
+            and self.board[x][y] == 0)
+
+    opp = self.bits[self.opponent(self.to_move)]
+    return is_single(NEIGHBORS[x * 5 + y] & ~opp)
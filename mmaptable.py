@@ -0,0 +1,107 @@
+# Read-only tables of fixed size records sorted by a 64-bit key, stored
+# in a binary file which is memory mapped rather than loaded, so opening
+# one costs nothing whatever its size and lookups are binary searches.
+#
+# File layout, little endian:
+#   magic (4 bytes), tag (uint64), record size (uint32), count (uint64)
+#   count records, sorted by their first field, the uint64 key
+# The tag is whatever the writer wants checked when reading, e.g. the
+# seed of the Zobrist keys.
+
+import mmap
+import struct
+
+HEADER = struct.Struct("<4sQIQ")
+
+
+def write_table(path, magic, tag, record_format, records):
+  """
+  Write records to path, sorted by key. When several records have the
+  same key, the last one is kept.
+  :param magic: 4 bytes telling which kind of table this is
+  :param record_format: struct format of a record, first field "Q"
+  :param records: iterable of tuples matching record_format
+  :return: the number of records written
+  """
+  record = struct.Struct(record_format)
+  by_key = {}
+  for r in records:
+    by_key[r[0]] = r
+  with open(path, "wb") as f:
+    f.write(HEADER.pack(magic, tag, record.size, len(by_key)))
+    for key in sorted(by_key):
+      f.write(record.pack(*by_key[key]))
+  return len(by_key)
+
+
+class MappedTable:
+
+  def __init__(self, path, magic, tag, record_format):
+    """
+    Map the table at path.
+    :param tag: the tag the table must have been written with, or None 
+                to accept any and check self.tag afterwards
+    """
+    self.format = struct.Struct(record_format)
+    self.map = None
+    self.file = open(path, "rb")
+    try:
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      # an empty file cannot be mapped
+      self.close()
+      raise Exception("bad table file: " + path)
+
+    if len(self.map) < HEADER.size:
+      self.close()
+      raise Exception("bad table file: " + path)
+    file_magic, file_tag, size, count = HEADER.unpack_from(self.map, 0)
+    if file_magic != magic:
+      self.close()
+      raise Exception("not a table of the expected kind: " + path)
+    if tag != None and file_tag != tag:
+      self.close()
+      raise Exception("table built with other keys: " + path)
+    if (size != self.format.size
+        or len(self.map) != HEADER.size + count * size):
+      self.close()
+      raise Exception("bad table file: " + path)
+    self.tag = file_tag
+    self.count = count
+
+  def __len__(self):
+    return self.count
+
+  def __getstate__(self):
+    raise Exception("a mapped table cannot be copied, share it instead")
+
+  def __iter__(self):
+    for i in range(self.count):
+      yield self.record(i)
+
+  def record(self, index):
+    return self.format.unpack_from(self.map,
+                                   HEADER.size + index * self.format.size)
+
+  def lookup(self, key):
+    """
+    :return: the record of key as a tuple, or None
+    """
+    unpack_from, size = self.format.unpack_from, self.format.size
+    lo, hi = 0, self.count
+    while lo < hi:
+      mid = (lo + hi) // 2
+      entry = unpack_from(self.map, HEADER.size + mid * size)
+      if entry[0] < key:
+        lo = mid + 1
+      elif entry[0] > key:
+        hi = mid
+      else:
+        return entry
+    return None
+
+  def close(self):
+    if self.map != None:
+      self.map.close()
+      self.map = None
+    self.file.close()
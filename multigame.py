@@ -0,0 +1,306 @@
+#!/usr/bin/python3
+
+# Play on many server boards from one process: one AsyncGthClient per
+# board and side, all on one event loop, while the searches run in a
+# shared pool of processes. With --side both the process takes both
+# seats of each board and plays itself through the server.
+#
+# A search task carries the engine configuration and the moves of its
+# game, so any worker can take it. Each worker keeps the engines of the
+# games it has seen, and brings one up to date with the moves it missed
+# instead of building it again.
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import time
+
+from board import Move
+from agthclient import AsyncGthClient, ClientError, MoveError
+from tournament import parse_config, nodes
+from engineoptions import make_engine, close_engine
+
+# engines kept by a worker process, see search_move()
+max_cached_engines = 64
+
+# seconds between two attempts to reach a server which is not up yet
+reconnect_delay = 0.5
+
+_engines = {}
+
+
+def search_move(task):
+  """
+  Worker side of a search.
+  :param task: a tuple (game key, configuration dict, side, moves played
+               so far as strings, seconds left or None, serial)
+  :return: a tuple (move string, nodes, seconds spent searching)
+  """
+  key, config, side, moves, my_time, serial = task
+  cached = _engines.get(key)
+  if cached is None or cached[1] != moves[:len(cached[1])]:
+    if cached is not None:
+      close_engine(_engines.pop(key)[0])
+    if len(_engines) >= max_cached_engines:
+      for engine, _ in _engines.values():
+        close_engine(engine)
+      _engines.clear()
+    cached = (make_engine(config, side), [])
+  engine, played = cached
+  for move in moves[len(played):]:
+    engine.try_move(Move.parse_string(move))
+  _engines[key] = (engine, list(moves))
+
+  start = time.monotonic()
+  if engine.time_manager != None:
+    engine.time_manager.start(my_time, serial)
+  move = engine.decision()
+  elapsed = time.monotonic() - start
+  if not move:
+    move = Move(0, 0, is_pass=True)
+  engine.try_move(move)
+  _engines[key][1].append(str(move))
+  return str(move), nodes(engine), elapsed
+
+
+def parse_servers(text):
+  """
+  :param text: server numbers and ranges, e.g. "0,2,5-9"
+  :return: a sorted list of server numbers
+  """
+  servers = set()
+  for part in text.split(","):
+    if "-" in part:
+      first, last = part.split("-")
+      servers.update(range(int(first), int(last) + 1))
+    else:
+      servers.add(int(part))
+  return sorted(servers)
+
+
+def percentile(values, p):
+  if not values:
+    return None
+  values = sorted(values)
+  return values[min(int(p * len(values)), len(values) - 1)]
+
+
+def summary(values):
+  if not values:
+    return None
+  return {
+    "count": len(values),
+    "mean": sum(values) / len(values),
+    "p50": percentile(values, 0.5),
+    "p95": percentile(values, 0.95),
+    "max": max(values)
+  }
+
+
+class MultiGame:
+
+  def __init__(self, servers, sides, config, games=1, workers=None,
+               host="localhost", connect_timeout=60, verbose=False):
+    """
+    :param sides: the sides played on every server
+    :param config: engine configuration as game.py flags, see
+                   tournament.parse_config()
+    :param games: number of games played one after the other on each
+                  board and side
+    :param connect_timeout: seconds to keep trying to reach a server
+    """
+    self.servers = servers
+    self.sides = sides
+    self.config = parse_config(config)
+    self.config_text = config
+    self.games = games
+    self.workers = workers or os.cpu_count()
+    self.host = host
+    self.connect_timeout = connect_timeout
+    self.verbose = verbose
+
+    self.results = []
+    # seconds per move: searching, waiting for the pool beyond that,
+    # and the server answering a move
+    self.search_times = []
+    self.queue_times = []
+    self.round_trips = []
+
+  async def run(self):
+    loop = asyncio.get_running_loop()
+    with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+      boards = [self.__play_board(loop, pool, server, side)
+                for server in self.servers for side in self.sides]
+      await asyncio.gather(*boards)
+
+  async def __play_board(self, loop, pool, server, side):
+    for game in range(self.games):
+      result = await self.__play_game(loop, pool, server, side, game)
+      self.results.append(result)
+      if self.verbose:
+        print("server: ", server, "side: ", side, "game: ", game,
+              "result: ", result["result"], "moves: ", len(result["moves"]))
+
+  async def __connect(self, server, side):
+    deadline = time.monotonic() + self.connect_timeout
+    while True:
+      try:
+        return await AsyncGthClient.connect(side, self.host, server)
+      except ConnectionError:
+        if time.monotonic() >= deadline:
+          raise
+        await asyncio.sleep(reconnect_delay)
+
+  async def __play_game(self, loop, pool, server, side, game):
+    """
+    Play one game on a board, as Gothelo.play() does.
+    :return: a dict describing the game
+    """
+    key = (os.getpid(), server, side, game)
+    client = await self.__connect(server, side)
+    moves = []
+    my_turn = side == "black"
+    result = None
+    try:
+      while result is None:
+        if my_turn:
+          task = (key, self.config, side, list(moves), client.my_time,
+                  client.serial)
+          start = time.monotonic()
+          move, _, searched = await loop.run_in_executor(pool, search_move,
+                                                         task)
+          self.search_times.append(searched)
+          self.queue_times.append(time.monotonic() - start - searched)
+          moves.append(move)
+          start = time.monotonic()
+          try:
+            playing = await client.make_move(move)
+          except MoveError as e:
+            if e.cause != e.ILLEGAL:
+              raise
+            # as game.py does, pass instead
+            moves[-1] = "pass"
+            playing = await client.make_move("pass")
+          self.round_trips.append(time.monotonic() - start)
+          if not playing:
+            result = client.winner
+        else:
+          playing, move = await client.get_move()
+          if move is not None:
+            moves.append(move)
+          if not playing:
+            result = client.winner
+        my_turn = not my_turn
+    except MoveError as e:
+      result = "draw" if client.drawn else "error: " + e.message
+    except (ClientError, ConnectionError) as e:
+      result = "error: " + str(getattr(e, "message", e))
+    finally:
+      client.closeall()
+
+    if result in ("black", "white"):
+      result = "win" if result == side else "loss"
+    return {
+      "server": server,
+      "side": side,
+      "game": game,
+      "result": result,
+      "moves": moves
+    }
+
+  def stats(self):
+    """
+    :return: the aggregated results, ready for json
+    """
+    counts = {}
+    for r in self.results:
+      counts[r["result"]] = counts.get(r["result"], 0) + 1
+    return {
+      "config": self.config_text,
+      "games": len(self.results),
+      "results": counts,
+      "search time": summary(self.search_times),
+      "pool wait": summary(self.queue_times),
+      "server round trip": summary(self.round_trips),
+      "per game": self.results
+    }
+
+
+def main():
+  parser = argparse.ArgumentParser(description='gothello multi-game client')
+
+  parser.add_argument('--servers',
+                      type=str,
+                      default="0",
+                      help="server numbers to play on, e.g. \"0-29\" or \
+                            \"0,2,4\"")
+
+  parser.add_argument('--side',
+                      '-s',
+                      type=str,
+                      choices=["black", "white", "both"],
+                      default="black",
+                      help="side to play on every board, both to take \
+                            both seats")
+
+  parser.add_argument('--config',
+                      '-c',
+                      type=str,
+                      default="",
+                      help="engine configuration as game.py flags, e.g. \
+                            \"-d 3 -e eye\"")
+
+  parser.add_argument('--games',
+                      '-n',
+                      type=int,
+                      default=1,
+                      help="number of games to play one after the other \
+                            on each board")
+
+  parser.add_argument('--workers',
+                      '-W',
+                      type=int,
+                      default=None,
+                      help="number of processes searching moves, all \
+                            cores by default")
+
+  parser.add_argument('--host',
+                      type=str,
+                      default="localhost",
+                      help="host of the servers")
+
+  parser.add_argument('--output',
+                      '-o',
+                      type=str,
+                      default=None,
+                      help="file to write the results and latency \
+                            statistics to, as json")
+
+  args = parser.parse_args()
+
+  sides = ["black", "white"] if args.side == "both" else [args.side]
+  multigame = MultiGame(parse_servers(args.servers),
+                        sides,
+                        args.config,
+                        games=args.games,
+                        workers=args.workers,
+                        host=args.host,
+                        verbose=True)
+  asyncio.run(multigame.run())
+
+  stats = multigame.stats()
+  print("games: ", stats["games"], "results: ", stats["results"])
+  for name in ("search time", "pool wait", "server round trip"):
+    s = stats[name]
+    if s != None:
+      print(name + ": ", "mean: ", round(s["mean"], 4),
+            "p95: ", round(s["p95"], 4), "max: ", round(s["max"], 4))
+  if args.output != None:
+    with open(args.output, "w") as f:
+      json.dump(stats, f, indent=1)
+
+
+if __name__ == "__main__":
+  main()
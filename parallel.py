@@ -0,0 +1,246 @@
+# Root splitting search over a pool of worker processes.
+#
+# The first root move (the eldest brother) is searched in the calling
+# process to get a bound, then the remaining root moves are searched by
+# the workers, Young Brothers Wait style. Workers share the best value
+# found so far through shared memory and narrow their window with it.
+#
+# Each worker keeps transposition tables of its own. The entries along
+# the line a worker found for its move are sent back and merged into the
+# caller's table, the rest stays in the worker.
+
+import multiprocessing
+
+from transposition import TranspositionTable
+from endgame import EndgameSolver
+from tablebase import Tablebase
+
+# pool shared by every engine of this process, created on first use
+_pool = None
+_pool_size = 0
+_pool_tablebase = None
+_shared_alpha = None
+
+# transposition tables a worker keeps, one per engine configuration
+max_worker_tables = 4
+
+# set in every worker by _init_worker()
+_worker_alpha = None
+_worker_ttables = {}
+_worker_ttable_size = 0
+_worker_solver = None
+_worker_tablebase = None
+
+
+def _init_worker(shared_alpha, ttable_size, tablebase_path):
+  global _worker_alpha, _worker_ttable_size, _worker_solver
+  global _worker_tablebase
+  _worker_alpha = shared_alpha
+  # each worker keeps its own tables for the whole game, the endgame
+  # cache holds results for the side to move and serves every engine
+  _worker_ttable_size = ttable_size
+  _worker_solver = EndgameSolver()
+  # mapped once per worker, not once per task
+  if tablebase_path != None:
+    _worker_tablebase = Tablebase(tablebase_path)
+
+
+def table_key(state):
+  """
+  Key of the worker table an engine uses. Entries hold values for the
+  engine's side under its evaluation, under canonical keys with 
+  symmetry, so engines differing in any of these get their own table.
+  :param state: an engine's __dict__, see snapshot()
+  """
+  return (state['side'],
+          state['evaluate_method'],
+          tuple(sorted(state['eval'].items())),
+          state['sym_keys'] is not None)
+
+
+def _worker_ttable(state):
+  """
+  Transposition table of this worker for the engine state was taken
+  from.
+  """
+  key = table_key(state)
+  ttable = _worker_ttables.get(key)
+  if ttable is None:
+    if len(_worker_ttables) >= max_worker_tables:
+      _worker_ttables.clear()
+    ttable = TranspositionTable(max_entries=_worker_ttable_size)
+    _worker_ttables[key] = ttable
+  return ttable
+
+
+def get_pool(workers, ttable_size, tablebase_path=None):
+  """
+  :param tablebase_path: file of the Tablebase the workers open, or None
+  """
+  global _pool, _pool_size, _pool_tablebase, _shared_alpha
+  if (_pool == None 
+      or _pool_size != workers 
+      or _pool_tablebase != tablebase_path):
+    shutdown()
+    _shared_alpha = multiprocessing.Value('d', 0.0)
+    _pool = multiprocessing.Pool(workers,
+                                 initializer=_init_worker,
+                                 initargs=(_shared_alpha, ttable_size,
+                                           tablebase_path))
+    _pool_size = workers
+    _pool_tablebase = tablebase_path
+  return _pool
+
+
+def shutdown():
+  global _pool, _pool_size, _pool_tablebase
+  if _pool != None:
+    _pool.terminate()
+    _pool.join()
+  _pool = None
+  _pool_size = 0
+  _pool_tablebase = None
+
+
+def snapshot(engine):
+  """
+  Copy of the engine state to send to the workers, without the
+  transposition table, endgame cache and tablebase (workers have their
+  own), the opening book (only used at the root) and the history of 
+  the moves played (workers only take back their own moves).
+  """
+  state = dict(engine.__dict__)
+  state['ttable'] = None
+  state['endgame_solver'] = None
+  state['tablebase'] = None
+  state['book'] = None
+  state['undo_stack'] = []
+  if engine.chain_history != None:
+    state['chain_history'] = []
+  return state
+
+
+def _line_entries(engine, line):
+  """
+  Entries of the engine's table for the positions along line, from the
+  current position on, to merge into the caller's table.
+  :return: a list of (key, entry) pairs
+  """
+  entries = []
+  for move in line:
+    engine.make_move(move)
+    key = engine.table_key()
+    entry = engine.ttable.entries.get(key)
+    if entry is not None:
+      entries.append((key, entry))
+  for _ in line:
+    engine.unmake_move()
+  return entries
+
+
+def _search_task(args):
+  """
+  Search one root move in a worker.
+  :return: a tuple (move, value, alpha, line, entries, nvisited, 
+           npruned, nttablehit, code) where alpha is the lower end of
+           the window actually used, line the best line after move,
+           entries the table entries along move and line, value is 
+           None and code the TerminationException code if the search 
+           was stopped early
+  """
+  from alphabetapruning import TerminationException
+
+  engine_class, state, move, depth, alpha, beta = args
+  engine = engine_class.__new__(engine_class)
+  engine.__dict__.update(state)
+  engine.ttable = _worker_ttable(state)
+  engine.ttable.age = state['ttable_age']
+  if engine.endgame > 0:
+    engine.endgame_solver = _worker_solver
+  if state['tablebase_used']:
+    engine.tablebase = _worker_tablebase
+  engine.nvisited, engine.npruned, engine.nttablehit = 0, 0, 0
+
+  alpha = max(alpha, _worker_alpha.value)
+  if alpha >= beta:
+    # another move already failed high, this one cannot matter
+    return move, None, alpha, [], [], 0, 0, 0, None
+  try:
+    value = engine.search_move(move, depth, alpha, beta)
+  except TerminationException as e:
+    return (move, None, alpha, [], [],
+            engine.nvisited, engine.npruned, engine.nttablehit, e.code)
+
+  if value > alpha:
+    with _worker_alpha.get_lock():
+      if value > _worker_alpha.value:
+        _worker_alpha.value = value
+  line = engine.principal_variation(1)
+  return (move, value, alpha, line, _line_entries(engine, [move] + line),
+          engine.nvisited, engine.npruned, engine.nttablehit, None)
+
+
+def root_split(engine, depth, alpha, beta):
+  """
+  Search the root of engine to depth with the worker pool.
+  :return: value and best move like a serial root search, or None if
+           the root has too few moves to split
+  """
+  from alphabetapruning import TerminationException
+
+  moves = engine.root_moves(depth)
+  if len(moves) < 2:
+    return None
+
+  engine.nvisited += 1
+  alpha_orig = alpha
+
+  # eldest brother, searched here with the full window
+  first = moves[0][0]
+  best_value = engine.search_move(first, depth, alpha, beta)
+  best_move = first
+  best_line = engine.principal_variation(1)
+  if best_value >= beta:
+    engine.set_principal_variation([first] + best_line)
+    engine.npruned += 1
+    engine.store_position(depth, best_value, alpha_orig, beta, best_move)
+    return best_value, best_move
+  alpha = max(alpha, best_value)
+
+  tablebase_path = None
+  if engine.tablebase != None:
+    tablebase_path = engine.tablebase.path
+  pool = get_pool(engine.workers, engine.ttable.max_entries, tablebase_path)
+  _shared_alpha.value = alpha
+
+  state = snapshot(engine)
+  state['ttable_age'] = engine.ttable.age
+  state['tablebase_used'] = tablebase_path != None
+  # what is left of the node budget is shared between the moves
+  remaining = engine.maximum_visited - engine.nvisited
+  state['maximum_visited'] = max(remaining // (len(moves) - 1), 1)
+  tasks = [(type(engine), state, move, depth, alpha, beta)
+           for move, _ in moves[1:]]
+
+  code = None
+  for (move, value, used_alpha, line, entries,
+       nvisited, npruned, nttablehit, stopped) in \
+      pool.imap_unordered(_search_task, tasks):
+    engine.ttable.merge(entries)
+    engine.nvisited += nvisited
+    engine.npruned += npruned
+    engine.nttablehit += nttablehit
+    if stopped != None:
+      code = stopped
+    elif value != None and value > used_alpha and value > best_value:
+      # a value not above the window only bounds the move from above
+      best_value, best_move, best_line = value, move, line
+
+  if code != None:
+    raise TerminationException(code)
+
+  if best_value >= beta:
+    engine.npruned += 1
+  engine.set_principal_variation([best_move] + best_line)
+  engine.store_position(depth, best_value, alpha_orig, beta, best_move)
+  return best_value, best_move
@@ -0,0 +1,132 @@
+import copy
+import threading
+
+from alphabetapruning import TerminationException
+
+# node budget of a ponder search when the engine runs on a clock
+ponder_maximum_visited = 10 ** 7
+
+
+class Ponderer:
+  """
+  Search on the opponent's time. After our move, a background thread
+  searches a copy of the engine: first our reply to the opponent move
+  predicted by the transposition table, then every other opponent move
+  to warm up the table. The copy shares the engine's transposition
+  table, so whatever it finds is used by the next decision() anyway.
+  Threads are enough here, the main thread spends that time blocked on
+  the server socket.
+
+  The copy runs the search decision() is configured for, same depth, 
+  iterative deepening and node budget. Only a clock is missing: an 
+  engine on a clock ponders with iterative deepening and a large node 
+  budget instead. A reply is handed over only when its search ran to
+  the end, otherwise the engine searches as usual.
+  """
+
+  def __init__(self, engine):
+    self.engine = engine
+    self.searcher = None
+    self.thread = None
+
+    # opponent move the first search is about, and our answer to it
+    # once that search has finished within its budget
+    self.predicted = None
+    self.ready_move = None
+
+  def start(self):
+    """
+    Start pondering the engine's position, the opponent to move.
+    """
+    engine = self.engine
+    # share the tables, copy everything else
+    searcher = copy.deepcopy(engine, {
+      id(engine.ttable): engine.ttable,
+      id(engine.endgame_solver): engine.endgame_solver,
+      id(engine.book): engine.book,
+      id(engine.tablebase): engine.tablebase
+    })
+    searcher.time_manager = None
+    searcher.print_stats = False
+    searcher.abort_search = False
+    # the abort flag does not reach worker processes, the endgame solver
+    # sees it through the searcher's checks
+    searcher.workers = 1
+    # one age for every decision of the session, so the engine's own
+    # entries are not aged once per opponent reply
+    searcher.age_table = False
+    engine.ttable.new_search()
+    if engine.time_manager != None:
+      # no node budget matches a clock, only a search which deepened
+      # until it could not go further hands its answer over
+      searcher.maximum_visited = ponder_maximum_visited
+
+    self.searcher = searcher
+    self.predicted = self.__predict()
+    self.ready_move = None
+    self.thread = threading.Thread(target=self.__run, daemon=True)
+    self.thread.start()
+
+  def stop(self, actual):
+    """
+    Stop pondering once the opponent move is known.
+    :param actual: the Move the opponent made, or None
+    :return: our move if the ponder search on actual is complete,
+             otherwise None
+    """
+    if self.thread is None:
+      return None
+    self.searcher.abort_search = True
+    self.thread.join()
+    self.thread = None
+    self.searcher = None
+    if (actual is not None
+        and self.predicted is not None
+        and actual == self.predicted):
+      return self.ready_move
+    return None
+
+  def __predict(self):
+    """
+    Best move stored for the opponent in the current position, if it is
+    still legal.
+    """
+    searcher = self.searcher
+    move = searcher.table_move()
+    if move is None or not searcher.move_ok(move)[0]:
+      return None
+    return move
+
+  def __run(self):
+    try:
+      self.__ponder()
+    except TerminationException:
+      # stop() aborted a search without iterative deepening, which has
+      # nothing to return; the copy is thrown away with its board
+      pass
+
+  def __ponder(self):
+    searcher = self.searcher
+    replies = [m for m, _ in searcher.gen_moves()]
+
+    if self.predicted is not None:
+      searcher.make_move(self.predicted)
+      move = searcher.decision()
+      searcher.unmake_move()
+      if searcher.abort_search:
+        return
+      if searcher.search_completed:
+        self.ready_move = move
+      replies = [m for m in replies if m != self.predicted]
+
+    if not replies:
+      return
+    # the other replies only warm up the table, they share the budget
+    searcher.maximum_visited = max(searcher.maximum_visited // len(replies),
+                                   1)
+    for reply in replies:
+      searcher.make_move(reply)
+      searcher.decision()
+      searcher.unmake_move()
+      if searcher.abort_search:
+        return
@@ -0,0 +1,471 @@
+#!/usr/bin/python3
+
+# Gothello referee, the Python counterpart of the Java Gthd server: the
+# same handshake, message codes and texts (see server_and_negamaxplayer/
+# Connection.java and Messages.java), so gthclient.py and the Java
+# clients play against it unchanged.
+#
+# The referee runs on asyncio. It either listens on the Gthd port,
+# server_base + server number, or takes clients through in-memory pipes
+# (see transport.py) to referee games inside one process without any
+# socket. As with Gthd, players and observers connect until both seats
+# are taken, then the game starts and no one else is let in.
+#
+# Differences with Gthd:
+#   - a player whose clock runs out loses at once instead of when its
+#     move finally arrives;
+#   - a player who disconnects loses, and the other connections are
+#     closed, where Gthd gives up.
+
+import argparse
+import asyncio
+import time
+
+from board import Move, PLAYER_BLACK, PLAYER_WHITE, OBSERVER
+from board import ILLEGAL_MOVE, GAME_OVER
+from bitboard import BitBoard
+from transport import StreamTransport, memory_pipe
+
+name = "Gothello"
+version = "0.9.1"
+server_base = 29068
+max_servers = 30
+max_observers = 65
+
+
+def secs(msecs):
+  return int(msecs / 1000)
+
+
+def side_name(who):
+  return "white" if who == PLAYER_WHITE else "black"
+
+
+class Connection:
+  """
+  A player or observer seen from the referee, with the messages of the
+  Java Connection and Messages classes.
+  """
+
+  def __init__(self, referee, transport):
+    self.referee = referee
+    self.transport = transport
+    self.who = None
+
+  def response(self, m):
+    self.transport.write(m + "\r\n")
+
+  async def request(self):
+    """
+    :return: the next non-empty line, or None when disconnected
+    """
+    while True:
+      line = await self.transport.readline()
+      if line is None or line.strip():
+        return line
+
+  def close(self):
+    self.transport.close()
+
+  def resp_greeting(self):
+    self.response("000 " + version + " version " + name
+                  + " server says hello!")
+
+  async def req_side(self):
+    """
+    :return: PLAYER_WHITE, PLAYER_BLACK, OBSERVER, or None after telling
+             the client what was wrong
+    """
+    req = await self.request()
+    if req is None:
+      return None
+    words = req.split()
+    got = words[0] if words else None
+    if got != version:
+      self.response("198 Illegal version number (expected " + version
+                    + " got " + str(got) + ")")
+      return None
+    if len(words) > 1 and words[1] == "observer":
+      return OBSERVER
+    if len(words) > 2 and words[1] == "player":
+      if words[2] == "white":
+        return PLAYER_WHITE
+      if words[2] == "black":
+        return PLAYER_BLACK
+    self.response("199 Request not understood")
+    return None
+
+  def accept(self):
+    referee = self.referee
+    if not referee.time_controls:
+      self.response("100 Request accepted")
+      return
+    if self.who == PLAYER_BLACK:
+      times = (referee.msecs[PLAYER_BLACK], referee.msecs[PLAYER_WHITE])
+      text = " Request accepted with time controls (you / opp)"
+    else:
+      times = (referee.msecs[PLAYER_WHITE], referee.msecs[PLAYER_BLACK])
+      if self.who == PLAYER_WHITE:
+        text = " Request accepted with time controls (you / opp)"
+      else:
+        text = " Request accepted with time controls"
+    self.response("101 " + str(secs(times[0])) + " " + str(secs(times[1]))
+                  + text)
+
+  def start(self):
+    if self.who == PLAYER_WHITE:
+      self.response("351 You will play white")
+    elif self.who == PLAYER_BLACK:
+      self.response("352 You will play black")
+    else:
+      self.response("353 You will observe")
+
+  async def get_move(self, serial, to_move):
+    """
+    Read requests until one is a well formed move, answering the others.
+    :return: a Move, or None when disconnected
+    """
+    while True:
+      req = await self.request()
+      if req is None:
+        return None
+      words = req.split()
+      if words[0] != str(serial):
+        self.response("299 Illegal serial number (got " + words[0]
+                      + " expected " + str(serial) + ")")
+        continue
+      words = words[1:]
+      if to_move == PLAYER_WHITE:
+        if not words or words[0] != "...":
+          self.response("299 Ellipses (...) expected before move")
+          continue
+        words = words[1:]
+      try:
+        return Move.parse_string(words[0] if words else "")
+      except Exception:
+        self.response("199 Request not understood")
+
+  def legal_move(self, m):
+    self.response("200 Move " + str(m) + " accepted, continue playing")
+
+  def legal_move_tc(self, m, time):
+    self.response("207 " + str(time) + " secs remaining after move "
+                  + str(m) + " accepted, continue playing")
+
+  def final_move(self, to_move, winner, m):
+    if to_move == winner:
+      result = "201", "You win"
+    elif winner == OBSERVER:
+      result = "203", "You draw"
+    else:
+      result = "202", "You lose"
+    self.response(result[0] + " Move " + str(m) + " accepted, "
+                  + result[1])
+
+  def flag_fell(self):
+    self.response("202 Your time expires, and you lose")
+
+  def illegal_move(self, m):
+    self.response("291 Illegal move " + str(m))
+
+  def move(self, serial, to_move, m, time=None):
+    """
+    Tell a move, with the time left on the mover's clock under time
+    controls.
+    """
+    if to_move == PLAYER_BLACK:
+      codes = (315, 311) if time is None else (317, 313)
+      ellipses = ""
+    else:
+      codes = (316, 312) if time is None else (318, 314)
+      ellipses = " ..."
+    code = codes[0] if m.is_pass else codes[1]
+    clock = "" if time is None else " " + str(time) + " (secs)"
+    self.response(str(code) + " " + str(serial) + ellipses + " " + str(m)
+                  + clock + " is " + side_name(to_move)
+                  + " move, game continues")
+    self.observe_state()
+
+  def stop(self, serial, to_move, winner, m):
+    if to_move == PLAYER_BLACK:
+      ellipses = ""
+      codes = {PLAYER_BLACK: ("321", "wins"),
+               PLAYER_WHITE: ("322", "loses"),
+               OBSERVER: ("325", "draws")}
+    else:
+      ellipses = " ..."
+      codes = {PLAYER_WHITE: ("323", "wins"),
+               PLAYER_BLACK: ("324", "loses"),
+               OBSERVER: ("326", "draws")}
+    code, result = codes[winner]
+    self.response(code + " " + str(serial) + ellipses + " " + str(m)
+                  + " and " + side_name(to_move) + " " + result)
+    self.observe_state()
+    self.close()
+
+  def stop_flag(self, serial, winner):
+    if winner == PLAYER_BLACK:
+      self.response("361 Black wins by White time expiring")
+    else:
+      self.response("362 White wins by Black time expiring")
+    self.observe_state()
+    self.close()
+
+  def observe_state(self):
+    if self.who == OBSERVER:
+      self.referee.print_board(self)
+
+
+class Referee:
+  """
+  Referee of one game. Clients are handed to connect(), then play()
+  runs the game once both players are seated.
+  """
+
+  def __init__(self, white_secs=None, black_secs=None, verbose=False):
+    """
+    :param white_secs: seconds on each clock, None without time controls
+    :param black_secs: seconds on black's clock if not the same as white
+    """
+    self.time_controls = white_secs != None
+    self.msecs = {PLAYER_WHITE: 0, PLAYER_BLACK: 0}
+    if self.time_controls:
+      self.msecs[PLAYER_WHITE] = white_secs * 1000
+      self.msecs[PLAYER_BLACK] = (black_secs if black_secs != None
+                                  else white_secs) * 1000
+    self.verbose = verbose
+
+    self.players = {}
+    self.observers = []
+    self.seated = asyncio.Event()
+    self.board = BitBoard()
+    self.moves = []
+
+    # handshakes started by connect_memory()
+    self.handshakes = set()
+
+  async def connect(self, transport):
+    """
+    Handshake with a new client and seat it.
+    :return: whether the client was seated
+    """
+    conn = Connection(self, transport)
+    conn.resp_greeting()
+    who = await conn.req_side()
+    if who is None:
+      conn.close()
+      return False
+    if self.seated.is_set():
+      # arrived after the game started
+      conn.response("193 Cannot observe" if who == OBSERVER
+                    else "191 Other player holds requested side")
+      conn.close()
+      return False
+    if who == OBSERVER:
+      if len(self.observers) >= max_observers:
+        conn.response("193 Cannot observe")
+        conn.close()
+        return False
+      self.observers.append(conn)
+    else:
+      if who in self.players:
+        conn.response("191 Other player holds requested side")
+        conn.close()
+        return False
+      self.players[who] = conn
+    conn.who = who
+    conn.accept()
+    self.__log(side_name(who) + " player connected" if who != OBSERVER
+               else "observer connected")
+    if len(self.players) == 2:
+      self.seated.set()
+    return True
+
+  def connect_memory(self):
+    """
+    Connect a client through an in-memory pipe. Must be called from the
+    event loop.
+    :return: the client's end of the pipe
+    """
+    referee_end, client_end = memory_pipe()
+    task = asyncio.ensure_future(self.connect(referee_end))
+    self.handshakes.add(task)
+    task.add_done_callback(self.handshakes.discard)
+    return client_end
+
+  async def play(self):
+    """
+    Wait for both players, then referee the game to its end.
+    :return: a dict with the winner ("black", "white" or "draw"), the
+             reason the game ended ("score", "time" or "disconnect") and
+             the moves played
+    """
+    await self.seated.wait()
+    everyone = self.observers + [self.players[PLAYER_WHITE],
+                                 self.players[PLAYER_BLACK]]
+    for conn in everyone:
+      conn.start()
+
+    board = self.board
+    while True:
+      to_move, serial = board.to_move, board.serial
+      move_conn = self.players[to_move]
+      # as in Gthd, the clock keeps running through rejected requests:
+      # malformed ones are answered within get_move(), and the time of
+      # an illegal move is charged before waiting for the next one
+      start = time.monotonic()
+      try:
+        if self.time_controls:
+          m = await asyncio.wait_for(move_conn.get_move(serial, to_move),
+                                     max(self.msecs[to_move], 0) / 1000)
+        else:
+          m = await move_conn.get_move(serial, to_move)
+      except asyncio.TimeoutError:
+        m = None
+        self.msecs[to_move] = -1
+      else:
+        if self.time_controls:
+          self.msecs[to_move] -= (time.monotonic() - start) * 1000
+
+      if self.time_controls and self.msecs[to_move] < 0:
+        winner = board.opponent(to_move)
+        self.__log(side_name(winner) + " player wins on time")
+        move_conn.flag_fell()
+        for conn in everyone:
+          conn.stop_flag(serial, winner)
+        return self.__result(winner, "time")
+
+      if m is None:
+        winner = board.opponent(to_move)
+        self.__log(side_name(to_move) + " player disconnected")
+        for conn in everyone:
+          conn.close()
+        return self.__result(winner, "disconnect")
+
+      status, _ = board.try_move(m)
+      if status == ILLEGAL_MOVE:
+        move_conn.illegal_move(m)
+        continue
+      self.moves.append(str(m))
+      if status == GAME_OVER:
+        winner = board.referee()
+        self.__log("game over, winner: " + (side_name(winner)
+                   if winner != OBSERVER else "draw"))
+        move_conn.final_move(to_move, winner, m)
+        for conn in everyone:
+          conn.stop(serial, to_move, winner, m)
+        return self.__result(winner, "score")
+
+      self.__log(str(serial) + " " + side_name(to_move) + " " + str(m))
+      time_left = secs(self.msecs[to_move]) if self.time_controls else None
+      if time_left is None:
+        move_conn.legal_move(m)
+      else:
+        move_conn.legal_move_tc(m, time_left)
+      for conn in everyone:
+        conn.move(serial, to_move, m, time_left)
+
+  def print_board(self, conn):
+    """
+    Send the board to an observer, as the Java Board.print().
+    """
+    board = self.board
+    if board.game_status == GAME_OVER:
+      status = "*"
+    elif board.to_move == PLAYER_WHITE:
+      status = "w"
+    else:
+      status = "b"
+    if self.time_controls:
+      conn.response("381 " + str(board.serial) + " "
+                    + str(secs(self.msecs[PLAYER_BLACK])) + " "
+                    + str(secs(self.msecs[PLAYER_WHITE])) + " " + status)
+    else:
+      conn.response("380 " + str(board.serial) + " " + status)
+    conn.response("382")
+    squares = {0: ".", PLAYER_BLACK: "b", PLAYER_WHITE: "w"}
+    for y in range(4, -1, -1):
+      conn.response("".join(squares[board.board[x][y]] for x in range(5)))
+
+  def __result(self, winner, reason):
+    return {
+      "winner": side_name(winner) if winner != OBSERVER else "draw",
+      "reason": reason,
+      "moves": self.moves
+    }
+
+  def __log(self, text):
+    if self.verbose:
+      print(text)
+
+
+async def serve(server, white_secs=None, black_secs=None, games=1,
+                host="localhost", verbose=False):
+  """
+  Referee games one after the other on the port of a server number,
+  listening only until both players of a game are seated.
+  :param games: number of games, 0 for no end
+  :return: the list of play() results
+  """
+  if server < 0 or server >= max_servers:
+    raise Exception("server number should be in 0.."
+                    + str(max_servers - 1))
+  results = []
+  while games == 0 or len(results) < games:
+    referee = Referee(white_secs, black_secs, verbose=verbose)
+
+    async def handle(reader, writer):
+      await referee.connect(StreamTransport(reader, writer))
+
+    listener = await asyncio.start_server(handle, host,
+                                          server_base + server)
+    try:
+      await referee.seated.wait()
+    finally:
+      listener.close()
+      await listener.wait_closed()
+    results.append(await referee.play())
+  return results
+
+
+def main():
+  parser = argparse.ArgumentParser(description='gothello referee')
+
+  parser.add_argument('server',
+                      type=int,
+                      help="server number, the port is %d plus it"
+                           % server_base)
+
+  parser.add_argument('secs',
+                      type=int,
+                      nargs='?',
+                      default=None,
+                      help="seconds on each clock, no time controls \
+                            without")
+
+  parser.add_argument('secs_black',
+                      type=int,
+                      nargs='?',
+                      default=None,
+                      help="seconds on black's clock")
+
+  parser.add_argument('--games',
+                      '-n',
+                      type=int,
+                      default=1,
+                      help="number of games to referee, 0 for no end")
+
+  args = parser.parse_args()
+
+  results = asyncio.run(serve(args.server,
+                              args.secs,
+                              args.secs_black,
+                              games=args.games,
+                              verbose=True))
+  for result in results:
+    print("winner: ", result["winner"], "by: ", result["reason"],
+          "moves: ", len(result["moves"]))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+
+# Endgame tablebase: exact results of positions with at most K empty
+# cells, computed offline and stored in a memory mapped table (see
+# mmaptable.py) keyed by the canonical key of the position.
+#
+# Every position with K empty cells is far too many to enumerate even
+# for small K (2300 ways to choose 3 empty cells, times 2^22 ways to
+# color the rest), and most of them cannot happen in a game. So the
+# generator solves the positions reachable from seed positions instead:
+# the K-empty positions of random games. The endgame solver visits and
+# caches every position below a seed, with passes, so the table holds
+# each of them. That is still a small sample of the positions a game
+# can reach: a search probing the table mostly misses, and a hit is the
+# exception.
+#
+# Seeds are split into chunks solved by a pool of processes. Each
+# finished chunk is written to its own file next to the table, and a
+# later run skips the chunks already there, so generation can be
+# stopped and resumed at any time. The chunks are merged at the end.
+
+import argparse
+import multiprocessing
+import os
+import random
+
+from board import ZOBRIST_SEED
+from bitboard import BitBoard
+from endgame import EndgameSolver, empty_count
+from mmaptable import MappedTable, write_table
+
+TABLEBASE_MAGIC = b"GTTB"
+
+# canonical key, WIN, DRAW or LOSS for the side to move
+TABLEBASE_RECORD = "<Qb"
+
+
+def tablebase_tag(empties):
+  # the tag records the Zobrist seed and K
+  return ZOBRIST_SEED * 256 + empties
+
+
+class Tablebase:
+  """
+  Read side of a generated table. The table only holds the positions
+  below the random seed games it was built from, a small sample of the
+  positions with K empty cells: most lookups miss, and the search goes
+  on as without a table.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.table = MappedTable(path, TABLEBASE_MAGIC, None, TABLEBASE_RECORD)
+    if self.table.tag // 256 != ZOBRIST_SEED:
+      self.table.close()
+      raise Exception("table built with other keys: " + path)
+
+    # positions with more empty cells are never in the table
+    self.empties = self.table.tag % 256
+
+  def __len__(self):
+    return len(self.table)
+
+  def __reduce__(self):
+    # copies, in other processes too, map the same file again
+    return (Tablebase, (self.path,))
+
+  def lookup(self, board):
+    """
+    :param board: a Board keeping its symmetric keys, see 
+                  Board.enable_symmetry(), otherwise each lookup 
+                  computes them all
+    :return: WIN, DRAW or LOSS for the side to move of board, or None
+             if the position is not in the table, the usual answer
+    """
+    if empty_count(board) > self.empties:
+      return None
+    entry = self.table.lookup(board.canonical_key()[0])
+    if entry is None:
+      return None
+    return entry[1]
+
+  def close(self):
+    self.table.close()
+
+
+def seed_line(rng, empties):
+  """
+  Random game from the empty board until at most empties cells are
+  left.
+  :return: the list of moves, or None if the game ended before
+  """
+  board = BitBoard()
+  line = []
+  while empty_count(board) > empties:
+    moves = board.gen_moves()
+    if not moves:
+      return None
+    move = rng.choice(moves)[0]
+    board.make_move(move)
+    line.append(move)
+  return line
+
+
+def chunk_path(path, chunk):
+  return "%s.chunks/%05d" % (path, chunk)
+
+
+def solve_chunk(args):
+  """
+  Solve the seeds of one chunk and write everything the solver cached
+  to the chunk's file.
+  :return: the chunk number and the number of positions written
+  """
+  path, chunk, empties, seeds_per_chunk, seed = args
+  rng = random.Random(seed * 1000003 + chunk)
+  # no limit, every result goes to the chunk file
+  solver = EndgameSolver(max_entries=1 << 62)
+  for _ in range(seeds_per_chunk):
+    line = seed_line(rng, empties)
+    if line is None:
+      continue
+    board = BitBoard()
+    board.enable_symmetry()
+    for move in line:
+      board.make_move(move)
+    solver.solve(board)
+
+  # written under another name first, so a killed run never leaves a
+  # truncated chunk behind
+  final = chunk_path(path, chunk)
+  partial = final + ".partial"
+  n = write_table(partial, TABLEBASE_MAGIC, tablebase_tag(empties),
+                  TABLEBASE_RECORD, solver.cache.items())
+  os.replace(partial, final)
+  return chunk, n
+
+
+def generate(path, empties, chunks, seeds_per_chunk, seed=0, workers=1,
+             verbose=False):
+  """
+  Build the tablebase at path, reusing the chunks of an interrupted run
+  with the same parameters.
+  :return: the number of positions in the table
+  """
+  os.makedirs(path + ".chunks", exist_ok=True)
+  tasks = [(path, chunk, empties, seeds_per_chunk, seed)
+           for chunk in range(chunks)
+           if not os.path.exists(chunk_path(path, chunk))]
+  if verbose:
+    print("chunks done: ", chunks - len(tasks), "to do: ", len(tasks))
+
+  if workers > 1:
+    pool = multiprocessing.Pool(workers)
+    try:
+      for chunk, n in pool.imap_unordered(solve_chunk, tasks):
+        if verbose:
+          print("chunk: ", chunk, "positions: ", n)
+    finally:
+      pool.terminate()
+      pool.join()
+  else:
+    for task in tasks:
+      chunk, n = solve_chunk(task)
+      if verbose:
+        print("chunk: ", chunk, "positions: ", n)
+
+  records = {}
+  for chunk in range(chunks):
+    table = MappedTable(chunk_path(path, chunk), TABLEBASE_MAGIC,
+                        tablebase_tag(empties), TABLEBASE_RECORD)
+    try:
+      for key, result in table:
+        records[key] = result
+    finally:
+      table.close()
+  return write_table(path, TABLEBASE_MAGIC, tablebase_tag(empties),
+                     TABLEBASE_RECORD, records.items())
+
+
+def main():
+  parser = argparse.ArgumentParser(description='gothello endgame tablebase')
+
+  parser.add_argument('--output',
+                      '-o',
+                      type=str,
+                      default="tablebase.bin",
+                      help="file to write the tablebase to, finished \
+                            chunks are kept in OUTPUT.chunks")
+
+  parser.add_argument('--empties',
+                      '-k',
+                      type=int,
+                      default=6,
+                      help="largest number of empty squares of the \
+                            positions in the table")
+
+  parser.add_argument('--chunks',
+                      '-c',
+                      type=int,
+                      default=64,
+                      help="number of chunks of seed positions")
+
+  parser.add_argument('--seeds',
+                      '-n',
+                      type=int,
+                      default=100,
+                      help="number of seed positions per chunk")
+
+  parser.add_argument('--seed',
+                      type=int,
+                      default=0,
+                      help="random seed of the seed positions, must stay \
+                            the same when resuming")
+
+  parser.add_argument('--workers',
+                      '-W',
+                      type=int,
+                      default=1,
+                      help="number of processes solving chunks")
+
+  args = parser.parse_args()
+
+  if args.empties < 0 or args.empties > 25:
+    raise Exception("bad number of empty squares")
+
+  n = generate(args.output,
+               args.empties,
+               args.chunks,
+               args.seeds,
+               seed=args.seed,
+               workers=args.workers,
+               verbose=True)
+  print("positions in tablebase: ", n)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,109 @@
+import time
+
+# a 5x5 game rarely lasts longer than this many moves per side
+expected_moves_per_side = 16
+
+# never plan for fewer moves than this, the game may go on with passes
+minimum_moves_left = 4
+
+# bounds of the predicted ratio between the time of an iteration and 
+# the time of the previous one
+minimum_growth = 1.5
+maximum_growth = 10.0
+default_growth = 4.0
+
+
+class TimeManager:
+  """
+  Per move deadlines for iterative deepening. The soft deadline is the
+  time we aim to spend on a move: no new iteration is started when it
+  is not predicted to finish before it. The hard deadline aborts the
+  running iteration.
+  """
+
+  def __init__(self, move_time=5.0, safety_margin=1.0, check_every=256):
+    # seconds per move when the server plays without time controls
+    self.move_time = move_time
+
+    # seconds of the clock never planned for, covering network and
+    # server latency
+    self.safety_margin = safety_margin
+
+    # number of visited nodes between two looks at the clock, counted
+    # down by check()
+    self.check_every = check_every
+    self.countdown = check_every
+
+    self.start_time = None
+    self.soft_deadline = None
+    self.hard_deadline = None
+
+    # timing of the iterations of the current move
+    self.iteration_start = None
+    self.last_iteration = None
+    self.predicted = 0
+
+  def start(self, remaining=None, serial=1):
+    """
+    Set the deadlines of the move about to be searched.
+    :param remaining: seconds left on our clock, or None without time
+                      controls
+    :param serial: current move number
+    """
+    self.start_time = time.monotonic()
+    if remaining == None:
+      soft = self.move_time
+      hard = 2 * self.move_time
+    else:
+      usable = max(remaining - self.safety_margin, 0)
+      moves_left = max(expected_moves_per_side - serial,
+                       minimum_moves_left)
+      soft = usable / moves_left
+      hard = min(3 * soft, usable / 2)
+    self.soft_deadline = self.start_time + soft
+    self.hard_deadline = self.start_time + hard
+    self.last_iteration = None
+    self.predicted = 0
+    self.countdown = self.check_every
+
+  def elapsed(self):
+    return time.monotonic() - self.start_time
+
+  def hard_expired(self):
+    return time.monotonic() >= self.hard_deadline
+
+  def check(self):
+    """
+    Count a visited node, and look at the clock once every check_every
+    of them.
+    :return: whether the hard deadline has passed
+    """
+    self.countdown -= 1
+    if self.countdown > 0:
+      return False
+    self.countdown = self.check_every
+    return self.hard_expired()
+
+  def iteration_started(self):
+    self.iteration_start = time.monotonic()
+
+  def iteration_finished(self):
+    """
+    Record the time of the iteration which just finished, and predict 
+    the time of the next one from the growth between the last two.
+    """
+    spent = time.monotonic() - self.iteration_start
+    if self.last_iteration:
+      growth = min(max(spent / self.last_iteration, minimum_growth), 
+                   maximum_growth)
+    else:
+      growth = default_growth
+    self.last_iteration = spent
+    self.predicted = spent * growth
+
+  def can_start_iteration(self):
+    """
+    Whether the next iteration is predicted to end before the soft 
+    deadline.
+    """
+    return time.monotonic() + self.predicted < self.soft_deadline
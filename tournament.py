@@ -0,0 +1,392 @@
+#!/usr/bin/python3
+
+# Self-play tournament between engine configurations, played in process
+# without the server: both engines of a game are boards of their own and
+# every move is applied to both, as Gothelo does with the server's
+# moves. Games run in a pool of processes.
+#
+# Each configuration is a string of game.py flags, e.g. "-d 3 -e eye".
+# Every pair of configurations plays games from the same random
+# openings, each opening once with either color. With --sprt, a pair
+# stops as soon as a sequential probability ratio test decides between
+# the first configuration being elo0 or elo1 stronger than the second.
+#
+# The results file is JSON: the configurations, every game with the
+# time and number of nodes of each move, and the totals of each pair
+# and configuration.
+
+import argparse
+import json
+import math
+import multiprocessing
+import queue
+import random
+import shlex
+import time
+
+from board import Move, PLAYER_BLACK, PLAYER_WHITE, GAME_OVER, ILLEGAL_MOVE
+from bitboard import BitBoard
+from mcts import MonteCarloTreeSearch
+from vectorminimax import VectorMinimax
+from engineoptions import add_engine_options, check_engine_options
+from engineoptions import make_engine, close_engine
+import parallel
+
+def config_parser():
+  """
+  The engine flags of game.py, those without a server.
+  """
+  parser = argparse.ArgumentParser(prog='configuration', add_help=False)
+  add_engine_options(parser)
+  return parser
+
+
+def parse_config(text):
+  """
+  :return: a dict of the flags in text
+  """
+  parser = config_parser()
+  args = parser.parse_args(shlex.split(text))
+  check_engine_options(parser, args)
+  return vars(args)
+
+
+def nodes(engine):
+  """
+  Work of the engine's last decision: states visited, playouts or
+  positions generated.
+  """
+  if isinstance(engine, MonteCarloTreeSearch):
+    return engine.nplayouts
+  if isinstance(engine, VectorMinimax):
+    return sum(engine.nply_positions)
+  return engine.nvisited
+
+
+def random_opening(rng, plies):
+  """
+  :return: a list of random legal moves from the empty board
+  """
+  board = BitBoard()
+  line = []
+  for _ in range(plies):
+    moves = board.gen_moves()
+    if not moves:
+      break
+    move = rng.choice(moves)[0]
+    board.make_move(move)
+    line.append(move)
+  return line
+
+
+def play_game(task):
+  """
+  Play one game to the end, two passes in a row.
+  :param task: a tuple (game number, pair, black configuration number,
+               white configuration number, black configuration, white
+               configuration, opening moves, random seed)
+  :return: a dict describing the game
+  """
+  number, pair, black, white, black_config, white_config, opening, seed \
+    = task
+  random.seed(seed)
+  engines = {
+    PLAYER_BLACK: make_engine(black_config, "black", seed),
+    PLAYER_WHITE: make_engine(white_config, "white", seed + 1)
+  }
+  try:
+    for move in opening:
+      for engine in engines.values():
+        engine.try_move(move)
+
+    moves = []
+    while True:
+      engine = engines[engines[PLAYER_BLACK].to_move]
+      if engine.time_manager != None:
+        engine.time_manager.start(None, engine.serial)
+      start = time.monotonic()
+      move = engine.decision()
+      elapsed = time.monotonic() - start
+      if not move:
+        move = Move(0, 0, is_pass=True)
+      moves.append({
+        "player": "black" if engine.side == PLAYER_BLACK else "white",
+        "move": "pass" if move.is_pass else str(move),
+        "nodes": nodes(engine),
+        "time": round(elapsed, 6)
+      })
+      for e in engines.values():
+        result, _ = e.try_move(move)
+        if result == ILLEGAL_MOVE:
+          raise Exception("illegal move in game %d: %s" % (number, move))
+      if result == GAME_OVER:
+        break
+    winner = engines[PLAYER_BLACK].referee()
+  finally:
+    for engine in engines.values():
+      close_engine(engine)
+  return {
+    "game": number,
+    "pair": pair,
+    "black": black,
+    "white": white,
+    "opening": [str(m) for m in opening],
+    "winner": {PLAYER_BLACK: "black", PLAYER_WHITE: "white"}.get(winner,
+                                                                 "draw"),
+    "moves": moves
+  }
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+  """
+  Log likelihood ratio of elo1 against elo0 for the observed results,
+  with the normal approximation of the score distribution.
+  """
+  n = wins + draws + losses
+  if n == 0:
+    return 0.0
+  score = (wins + draws / 2) / n
+  variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2
+              + losses * score ** 2) / n
+  if variance == 0:
+    return 0.0
+  s0 = 1 / (1 + 10 ** (-elo0 / 400))
+  s1 = 1 / (1 + 10 ** (-elo1 / 400))
+  return n * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+class Tournament:
+
+  def __init__(self, configs, games, openings=2, seed=0, workers=1,
+               sprt=False, elo0=0, elo1=50, alpha=0.05, beta=0.05):
+    """
+    :param configs: configuration strings, see parse_config()
+    :param games: number of games of each pair, rounded up to even
+    :param openings: number of random plies played before the engines
+    """
+    self.configs = configs
+    self.parsed = [parse_config(c) for c in configs]
+    self.workers = workers
+    # pool workers are daemons, which cannot start a pool of their own
+    if workers > 1 and any(c['workers'] > 1 for c in self.parsed):
+      raise Exception("configurations with --workers need a tournament "
+                      "played by a single process")
+
+    self.sprt = sprt
+    self.elo0, self.elo1 = elo0, elo1
+    self.lower_bound = math.log(beta / (1 - alpha))
+    self.upper_bound = math.log((1 - beta) / alpha)
+
+    self.pairs = []
+    self.tasks = []
+    rng = random.Random(seed)
+    lines = [random_opening(random.Random(seed * 1000003 + k), openings)
+             for k in range((games + 1) // 2)]
+    for a in range(len(configs)):
+      for b in range(a + 1, len(configs)):
+        pair = len(self.pairs)
+        self.pairs.append({
+          "first": a, "second": b,
+          "wins": 0, "draws": 0, "losses": 0,
+          "llr": 0.0, "decision": None
+        })
+        for line in lines:
+          for black, white in ((a, b), (b, a)):
+            self.tasks.append((len(self.tasks), pair, black, white,
+                               self.parsed[black], self.parsed[white],
+                               line, rng.getrandbits(32)))
+
+    self.games = []
+
+  def run(self, verbose=False):
+    """
+    Play the games, keeping every worker busy with games of pairs the
+    SPRT has not decided yet.
+    """
+    pending = list(reversed(self.tasks))
+
+    def next_task():
+      while pending:
+        task = pending.pop()
+        if self.pairs[task[1]]["decision"] is None:
+          return task
+      return None
+
+    if self.workers <= 1:
+      task = next_task()
+      while task is not None:
+        self.__record(play_game(task), verbose)
+        task = next_task()
+      return
+
+    pool = multiprocessing.Pool(self.workers)
+    results = queue.Queue()
+    try:
+      running = 0
+      while True:
+        while running < self.workers:
+          task = next_task()
+          if task is None:
+            break
+          pool.apply_async(play_game, (task,), callback=results.put,
+                           error_callback=results.put)
+          running += 1
+        if running == 0:
+          break
+        game = results.get()
+        running -= 1
+        if isinstance(game, BaseException):
+          raise game
+        self.__record(game, verbose)
+    finally:
+      pool.terminate()
+      pool.join()
+
+  def __record(self, game, verbose):
+    pair = self.pairs[game["pair"]]
+    first_color = "black" if game["black"] == pair["first"] else "white"
+    self.games.append(game)
+
+    if game["winner"] == "draw":
+      pair["draws"] += 1
+    elif game["winner"] == first_color:
+      pair["wins"] += 1
+    else:
+      pair["losses"] += 1
+
+    if self.sprt and pair["decision"] is None:
+      pair["llr"] = sprt_llr(pair["wins"], pair["draws"], pair["losses"],
+                             self.elo0, self.elo1)
+      if pair["llr"] >= self.upper_bound:
+        pair["decision"] = "H1"
+      elif pair["llr"] <= self.lower_bound:
+        pair["decision"] = "H0"
+
+    if verbose:
+      print("game: ", game["game"], "black: ", game["black"],
+            "white: ", game["white"], "winner: ", game["winner"],
+            "pair: ", "%d-%d-%d" % (pair["wins"], pair["draws"],
+                                    pair["losses"]),
+            "llr: ", round(pair["llr"], 3) if self.sprt else "-")
+
+  def results(self):
+    """
+    :return: the results as a dict ready for json
+    """
+    engines = [{"config": c, "games": 0, "moves": 0, "nodes": 0,
+                "time": 0.0} for c in self.configs]
+    for game in self.games:
+      for color in ("black", "white"):
+        engine = engines[game[color]]
+        engine["games"] += 1
+        for move in game["moves"]:
+          if move["player"] == color:
+            engine["moves"] += 1
+            engine["nodes"] += move["nodes"]
+            engine["time"] += move["time"]
+    for engine in engines:
+      moves = max(engine["moves"], 1)
+      engine["nodes per move"] = engine["nodes"] / moves
+      engine["time per move"] = engine["time"] / moves
+
+    return {
+      "configs": self.configs,
+      "sprt": {"elo0": self.elo0, "elo1": self.elo1,
+               "lower bound": self.lower_bound,
+               "upper bound": self.upper_bound} if self.sprt else None,
+      "pairs": self.pairs,
+      "engines": engines,
+      "games": sorted(self.games, key=lambda g: g["game"])
+    }
+
+  def write(self, path):
+    with open(path, "w") as f:
+      json.dump(self.results(), f, indent=1)
+
+
+def main():
+  parser = argparse.ArgumentParser(description='gothello tournament')
+
+  parser.add_argument('--config',
+                      '-c',
+                      type=str,
+                      action='append',
+                      required=True,
+                      help="an engine configuration as game.py flags, \
+                            e.g. \"-d 3 -e eye\", given at least twice")
+
+  parser.add_argument('--games',
+                      '-n',
+                      type=int,
+                      default=20,
+                      help="number of games between each pair of \
+                            configurations")
+
+  parser.add_argument('--openings',
+                      type=int,
+                      default=2,
+                      help="number of random plies starting each game, \
+                            every opening is played with both colors")
+
+  parser.add_argument('--seed',
+                      type=int,
+                      default=0,
+                      help="random seed of the openings and engines")
+
+  parser.add_argument('--workers',
+                      '-W',
+                      type=int,
+                      default=1,
+                      help="number of processes playing games")
+
+  parser.add_argument('--sprt',
+                      action='store_true',
+                      help="stop a pair as soon as a sequential \
+                            probability ratio test decides it")
+
+  parser.add_argument('--elo0',
+                      type=float,
+                      default=0,
+                      help="elo difference of the SPRT null hypothesis")
+
+  parser.add_argument('--elo1',
+                      type=float,
+                      default=50,
+                      help="elo difference of the SPRT alternative \
+                            hypothesis")
+
+  parser.add_argument('--output',
+                      '-o',
+                      type=str,
+                      default="results.json",
+                      help="file to write the results to")
+
+  args = parser.parse_args()
+
+  if len(args.config) < 2:
+    raise Exception("a tournament needs at least two configurations")
+
+  tournament = Tournament(args.config,
+                          args.games,
+                          openings=args.openings,
+                          seed=args.seed,
+                          workers=args.workers,
+                          sprt=args.sprt,
+                          elo0=args.elo0,
+                          elo1=args.elo1)
+  try:
+    tournament.run(verbose=True)
+  finally:
+    # games finished so far are kept when interrupted
+    tournament.write(args.output)
+    parallel.shutdown()
+
+  for pair in tournament.pairs:
+    print(args.config[pair["first"]], "vs", args.config[pair["second"]],
+          "W/D/L: ", "%d/%d/%d" % (pair["wins"], pair["draws"],
+                                   pair["losses"]),
+          "sprt: ", pair["decision"])
+
+
+if __name__ == "__main__":
+  main()
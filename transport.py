@@ -0,0 +1,133 @@
+# Line transports of the Gothello protocol for asyncio: TCP streams, and
+# in-memory pipes connecting a referee and its clients in one process
+# without sockets.
+#
+# Lines may end with CR, LF or both, as the Java server reads them;
+# empty lines are returned as such and skipped by the readers of
+# messages.
+
+import abc
+import asyncio
+import re
+
+LINE_END = re.compile("[\r\n]")
+
+
+class Transport(abc.ABC):
+  """
+  Base of the transports: subclasses read chunks of text with _read()
+  and send text with write().
+  """
+
+  def __init__(self):
+    self.buffer = ""
+    self.eof = False
+
+  async def readline(self):
+    """
+    :return: the next line without its end, or None at end of input
+    """
+    while True:
+      end = LINE_END.search(self.buffer)
+      if end:
+        line = self.buffer[:end.start()]
+        self.buffer = self.buffer[end.end():]
+        return line
+      if self.eof:
+        if self.buffer:
+          line, self.buffer = self.buffer, ""
+          return line
+        return None
+      chunk = await self._read()
+      if not chunk:
+        self.eof = True
+      else:
+        self.buffer += chunk
+
+  @abc.abstractmethod
+  async def _read(self):
+    """
+    :return: some text, or "" at end of input
+    """
+
+  @abc.abstractmethod
+  def write(self, text):
+    pass
+
+  async def drain(self):
+    """
+    Wait until written text is on its way.
+    """
+    pass
+
+  @abc.abstractmethod
+  def close(self):
+    pass
+
+
+class StreamTransport(Transport):
+  """
+  Transport over an asyncio stream, a TCP connection.
+  """
+
+  def __init__(self, reader, writer):
+    super().__init__()
+    self.reader = reader
+    self.writer = writer
+
+  async def _read(self):
+    try:
+      data = await self.reader.read(4096)
+    except ConnectionError:
+      return ""
+    return data.decode("utf_8", errors="replace")
+
+  def write(self, text):
+    if not self.writer.is_closing():
+      self.writer.write(text.encode("utf_8"))
+
+  async def drain(self):
+    try:
+      await self.writer.drain()
+    except ConnectionError:
+      pass
+
+  def close(self):
+    self.writer.close()
+
+
+class MemoryTransport(Transport):
+  """
+  One end of an in-memory pipe, see memory_pipe().
+  """
+
+  def __init__(self, incoming, outgoing):
+    super().__init__()
+    self.incoming = incoming
+    self.outgoing = outgoing
+    self.closed = False
+
+  async def _read(self):
+    chunk = await self.incoming.get()
+    if chunk is None:
+      # the other end closed, later reads find eof set
+      return ""
+    return chunk
+
+  def write(self, text):
+    if not self.closed:
+      self.outgoing.put_nowait(text)
+
+  def close(self):
+    if not self.closed:
+      self.closed = True
+      self.outgoing.put_nowait(None)
+
+
+def memory_pipe():
+  """
+  :return: two connected MemoryTransport, what one writes the other
+           reads
+  """
+  a, b = asyncio.Queue(), asyncio.Queue()
+  return MemoryTransport(a, b), MemoryTransport(b, a)
@@ -0,0 +1,111 @@
+# Transposition table shared by every search of one engine, so that
+# results survive iterative deepening iterations and the moves of a game.
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# entry layout, entries are plain tuples to keep them small
+ENTRY_DEPTH = 0
+ENTRY_VALUE = 1
+ENTRY_FLAG = 2
+ENTRY_MOVE = 3
+ENTRY_AGE = 4
+
+
+class TranspositionTable:
+
+  def __init__(self, max_entries=500000):
+    # zobrist key -> (depth, value, flag, best move, age)
+    self.entries = {}
+    self.max_entries = max_entries
+
+    # bumped by new_search(), entries of older searches are replaced
+    # first
+    self.age = 0
+
+  def __len__(self):
+    return len(self.entries)
+
+  def new_search(self):
+    """
+    Called once per decision(), before searching.
+    """
+    self.age += 1
+
+  def clear(self):
+    self.entries = {}
+    self.age = 0
+
+  def probe(self, key, depth, alpha, beta):
+    """
+    Look up a position searched before.
+    :param depth: remaining depth the caller would search
+    :return: a tuple (value, move)
+             value is the stored value if the entry is deep enough and
+             its bound decides the (alpha, beta) window, otherwise None
+             move is the stored best move, or None
+    """
+    entry = self.entries.get(key)
+    if entry is None:
+      return None, None
+    move = entry[ENTRY_MOVE]
+    if entry[ENTRY_DEPTH] < depth:
+      return None, move
+    value, flag = entry[ENTRY_VALUE], entry[ENTRY_FLAG]
+    if (flag == EXACT
+        or (flag == LOWER_BOUND and value >= beta)
+        or (flag == UPPER_BOUND and value <= alpha)):
+      return value, move
+    return None, move
+
+  def store(self, key, depth, value, alpha, beta, move):
+    """
+    Store the result of searching a position with window (alpha, beta).
+    The bound type is derived from where value falls in the window.
+    """
+    if value <= alpha:
+      flag = UPPER_BOUND
+    elif value >= beta:
+      flag = LOWER_BOUND
+    else:
+      flag = EXACT
+
+    entry = self.entries.get(key)
+    if entry is not None:
+      # keep a deeper result of the current search
+      if entry[ENTRY_AGE] == self.age and entry[ENTRY_DEPTH] > depth:
+        return
+      if move is None:
+        move = entry[ENTRY_MOVE]
+    elif len(self.entries) >= self.max_entries:
+      self.__evict()
+
+    self.entries[key] = (depth, value, flag, move, self.age)
+
+  def merge(self, entries):
+    """
+    Add entries found by another table of the same engine, a worker's.
+    A deeper result of the current search is kept over them.
+    :param entries: a list of (key, entry) pairs
+    """
+    for key, (depth, value, flag, move, _) in entries:
+      entry = self.entries.get(key)
+      if entry is not None:
+        if entry[ENTRY_AGE] == self.age and entry[ENTRY_DEPTH] > depth:
+          continue
+      elif len(self.entries) >= self.max_entries:
+        self.__evict()
+      self.entries[key] = (depth, value, flag, move, self.age)
+
+  def __evict(self):
+    """
+    Drop entries left by older searches, or everything if the current
+    search alone filled the table.
+    """
+    age = self.age
+    self.entries = {k: e
+                    for k, e in self.entries.items()
+                    if e[ENTRY_AGE] == age}
+    if len(self.entries) >= self.max_entries:
+      self.entries = {}
@@ -0,0 +1,210 @@
+# Full width minimax computed a ply at a time with NumPy. The tree is
+# expanded breadth first: the positions of each ply are uint32 arrays of
+# black and white stone bitmasks, with the index of each position's
+# parent in the ply above. Legality, captures and evaluation are done
+# for a whole ply with the operations of bitboard.py on arrays, and the
+# values are backed up from the last ply with segment reductions over
+# the children of each parent, which are consecutive.
+#
+# There is no pruning, so the number of positions grows by the branching
+# factor at each ply: this is for shallow depths only. Every node gets
+# its exact minimax value, which makes the engine an oracle for checking
+# the pruned search, see root_values().
+
+import random
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+from board import Move, PLAYER_BLACK, PLAYER_WHITE
+from bitboard import FULL, NOT_Y4, NOT_Y0
+from minimax_utility import MinimaxUtility
+import batcheval
+
+# parents expanded together, bounding the size of temporary arrays
+expand_chunk = 1 << 14
+
+
+def flood(stones, seed):
+  """
+  bitboard.flood() of every element of an array.
+  """
+  group = seed & stones
+  while True:
+    grown = (group | batcheval.dilate(group)) & stones
+    if numpy.array_equal(grown, group):
+      return group
+    group = grown
+
+
+def expand(own, opp):
+  """
+  Legal moves of the side to move in every position, and the positions
+  they lead to, with the rules of BitBoard.move_ok() and captures().
+  :param own: uint32 array of the stones of the side to move
+  :param opp: uint32 array of the other side's stones
+  :return: a tuple (parent, cell, nlib, own, opp) of arrays, one element
+           per child ordered by parent then cell, where nlib is the
+           number of liberties of the placed stone before captures
+  """
+  n = len(own)
+  parent = numpy.repeat(numpy.arange(n), 25)
+  cell = numpy.tile(numpy.arange(25), n)
+  own = own[parent]
+  opp = opp[parent]
+  b = numpy.left_shift(numpy.uint32(1), cell.astype(numpy.uint32))
+
+  keep = (b & (own | opp)) == 0
+  parent, cell, own, opp, b = (parent[keep], cell[keep], own[keep],
+                               opp[keep], b[keep])
+
+  placed = own | b
+  empty = FULL & ~(placed | opp)
+  nlib = batcheval.popcount(batcheval.dilate(flood(placed, b)) & empty)
+  keep = nlib > 0
+  parent, cell, nlib, placed, opp, b, empty = (
+    parent[keep], cell[keep], nlib[keep], placed[keep], opp[keep],
+    b[keep], empty[keep])
+
+  # each neighbor of the stone may belong to a different group
+  captured = numpy.zeros_like(b)
+  for neighbor in (b << 5, b >> 5, (b & NOT_Y4) << 1, (b & NOT_Y0) >> 1):
+    group = flood(opp, neighbor & FULL)
+    dead = (batcheval.dilate(group) & empty) == 0
+    captured |= numpy.where(dead, group, 0).astype(numpy.uint32)
+
+  return parent, cell, nlib, placed | captured, opp & ~captured
+
+
+class VectorMinimax(MinimaxUtility):
+  """
+  Fixed depth minimax without pruning, playing through the same
+  decision() interface as AlphaBetaPruning. Like the minimax search, a
+  position without legal moves is evaluated as a leaf and passes are
+  never searched.
+  """
+
+  def __init__(self,
+               side,
+               depth=3,
+               eval_method="number",
+               scoring={
+                 'stone': 1,
+                 'black eye': 1,
+                 'white eye': 1
+               },
+               move_selection=False,
+               print_stats=False,
+               max_positions=4000000):
+    if numpy is None:
+      raise Exception("vector minimax needs numpy")
+
+    super().__init__(side,
+                     eval_method=eval_method,
+                     scoring=scoring)
+
+    self.depth = depth
+
+    # pick the move with most liberties among moves with the same value
+    self.select_by_nlib = move_selection
+
+    self.print_stats = print_stats
+
+    # largest number of positions of one ply
+    self.max_positions = max_positions
+
+    # decision() is never limited by time
+    self.time_manager = None
+
+    # test-purpose -- number of positions of each ply in the last search
+    self.nply_positions = []
+
+  def decision(self):
+    moves = self.root_values(self.depth)
+    if not moves:
+      return None
+
+    value = max(v for _, v, _ in moves)
+    candidates = [(move, nlib) for move, v, nlib in moves if v == value]
+    if self.select_by_nlib:
+      max_nlib = max(nlib for _, nlib in candidates)
+      candidates = [c for c in candidates if c[1] == max_nlib]
+    move = random.choice(candidates)[0]
+
+    if self.print_stats:
+      print("number of states visited: ", sum(self.nply_positions) - 1)
+      print("number of states per ply: ", self.nply_positions)
+      print("move: ", move, "value: ", value)
+    return move
+
+  def root_values(self, depth):
+    """
+    Minimax value of every legal move of the current position, searched
+    to depth plies from the current position.
+    :return: a list of tuples (move, value, nlib) in move order, values
+             for self.side, empty without legal moves
+    """
+    if depth < 1:
+      raise Exception("vector minimax needs a depth of at least 1")
+
+    black = numpy.array([self.bits[PLAYER_BLACK]], dtype=numpy.uint32)
+    white = numpy.array([self.bits[PLAYER_WHITE]], dtype=numpy.uint32)
+    plies = [(None, black, white)]
+    to_move = self.to_move
+    root_cells = root_nlib = None
+
+    for ply in range(depth):
+      _, black, white = plies[-1]
+      own, opp = ((black, white) if to_move == PLAYER_BLACK
+                  else (white, black))
+      parents, cells, nlibs, owns, opps = [], [], [], [], []
+      for start in range(0, len(own), expand_chunk):
+        parent, cell, nlib, child_own, child_opp = expand(
+          own[start:start + expand_chunk], opp[start:start + expand_chunk])
+        parents.append(parent + start)
+        cells.append(cell)
+        nlibs.append(nlib)
+        owns.append(child_own)
+        opps.append(child_opp)
+      parent = numpy.concatenate(parents)
+      if len(parent) > self.max_positions:
+        raise Exception("too many positions at ply %d" % (ply + 1))
+      if ply == 0:
+        root_cells = numpy.concatenate(cells)
+        root_nlib = numpy.concatenate(nlibs)
+      child_own, child_opp = numpy.concatenate(owns), numpy.concatenate(opps)
+      if to_move == PLAYER_BLACK:
+        plies.append((parent, child_own, child_opp))
+      else:
+        plies.append((parent, child_opp, child_own))
+      to_move = self.opponent(to_move)
+      if len(parent) == 0:
+        break
+
+    self.nply_positions = [len(black) for _, black, _ in plies]
+    if len(root_cells) == 0:
+      return []
+
+    # back up from the last ply, to_move being the side to move there
+    _, black, white = plies[-1]
+    values = batcheval.evaluate_arrays(black, white, self.side,
+                                       self.evaluate_method, self.eval)
+    for ply in range(len(plies) - 1, 1, -1):
+      to_move = self.opponent(to_move)
+      parent = plies[ply][0]
+      _, black, white = plies[ply - 1]
+      # leaves without legal moves keep their static value
+      backed = batcheval.evaluate_arrays(black, white, self.side,
+                                         self.evaluate_method, self.eval)
+      if len(parent) > 0:
+        # parent is sorted, each run of equal parents is one segment
+        parents, starts = numpy.unique(parent, return_index=True)
+        reduce = (numpy.maximum if to_move == self.side
+                  else numpy.minimum)
+        backed[parents] = reduce.reduceat(values, starts)
+      values = backed
+
+    return [(Move(int(c) // 5, int(c) % 5), int(v), int(nlib))
+            for c, v, nlib in zip(root_cells, values, root_nlib)]